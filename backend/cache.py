@@ -0,0 +1,122 @@
+"""In-process read cache for catalog lookups and analytics responses.
+
+A bounded LRU with a per-entry TTL. Writers invalidate affected keys (or key
+prefixes) directly, so the TTL only bounds staleness from writes made by
+other worker processes. Every invalidation bumps a generation number; a load
+that started before one may have read pre-write data, so its result is not
+cached. SingleFlight coalesces concurrent identical loads so
+a burst of requests costs one computation.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self.generation = 0
+        # Entries are also read from job threads, not just the event loop
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (True, value) on a fresh hit, else (False, None)"""
+        if not self.enabled:
+            return False, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, generation: int = None):
+        """Store `value`; with the `generation` its load started in, only if
+        nothing has been invalidated since"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    async def get_or_load(self, key, loader, cache_none: bool = True):
+        """Cached value for `key`, awaiting `loader()` to fill it on a miss.
+
+        With cache_none=False a None result is returned but not stored.
+        """
+        hit, value = self.get(key)
+        if hit:
+            return value
+        generation = self.generation
+        value = await loader()
+        if value is not None or cache_none:
+            self.set(key, value, generation)
+        return value
+
+    def invalidate(self, *keys, prefix: str = None):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+            if prefix:
+                for key in [k for k in self._entries if k.startswith(prefix)]:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """Share one in-flight computation among concurrent callers with the same key"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, loader):
+        future = self._inflight.get(key)
+        if future is None:
+            self.started += 1
+            future = asyncio.ensure_future(loader())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._forget(key, future))
+        else:
+            self.coalesced += 1
+        # Shield so one caller disconnecting doesn't cancel the shared load
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
@@ -0,0 +1,87 @@
+"""In-process event bus and fan-out for live dashboard updates.
+
+Write paths publish small events (a loan was issued, a user created) to the
+EventBus without waiting on anyone. A consumer such as the dashboard feed
+turns a burst of them into one recomputation, then hands the resulting
+message to a Fanout, which queues the same pre-encoded bytes for every
+connected client.
+
+Events only reach subscribers in the same worker process; consumers that
+must also see other workers' writes refresh on a timer as well.
+"""
+import asyncio
+import json
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers = set()
+
+    def subscribe(self, maxsize: int = 1000) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, kind: str, **data):
+        """Queue an event for every subscriber; never blocks, drops it for a full queue"""
+        event = {"kind": kind, **data}
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+
+def drain(queue: asyncio.Queue) -> list:
+    """Everything currently waiting in `queue`"""
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+class Fanout:
+    """One message, many client queues.
+
+    A client that falls `maxsize` messages behind has its backlog replaced by
+    a single resync message (the full current state), so slow readers cost
+    bounded memory and still converge.
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self._clients = set()
+
+    def add(self) -> asyncio.Queue:
+        queue = asyncio.Queue(self.maxsize)
+        self._clients.add(queue)
+        return queue
+
+    def remove(self, queue: asyncio.Queue):
+        self._clients.discard(queue)
+
+    def send(self, message: bytes, resync: bytes):
+        for queue in self._clients:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                drain(queue)
+                queue.put_nowait(resync)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+def sse(event: str, data, id: int = None, default=None) -> bytes:
+    """A Server-Sent Events message with a JSON payload"""
+    lines = [f"event: {event}"]
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines.append(f"data: {json.dumps(data, default=default, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode()
@@ -0,0 +1,178 @@
+"""Background jobs for work that should not run inside a request handler.
+
+Job state lives in the `jobs` collection so any worker can answer a status
+poll; the work itself runs as an asyncio task in the worker that accepted it,
+with CPU-bound steps pushed onto a thread pool via `run_in_pool`.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+# Strong references so running jobs are not garbage collected mid-flight
+_running_tasks = set()
+
+# Time past a job's timeout before it is presumed lost with its worker
+DEADLINE_SLACK = timedelta(seconds=60)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def public_job(job: dict) -> dict:
+    """Job document as returned by the API"""
+    job = dict(job)
+    job["job_id"] = job.pop("_id")
+    return job
+
+
+async def get_job(db, job_id: str):
+    """The job, marked failed first if it is still unfinished past its deadline
+    (e.g. the worker running it died)"""
+    job = await db.jobs.find_one({"_id": job_id})
+    if (job and job["status"] in ("pending", "running") and job.get("deadline")
+            and datetime.fromisoformat(job["deadline"]) < datetime.now(timezone.utc)):
+        await db.jobs.update_one(
+            {"_id": job_id, "status": job["status"]},
+            {"$set": {"status": "failed", "error": "Job did not finish by its deadline", "finished_at": _now()}}
+        )
+        job = await db.jobs.find_one({"_id": job_id})
+    return job
+
+
+async def update_progress(db, job_id: str, **progress):
+    await db.jobs.update_one(
+        {"_id": job_id},
+        {"$set": {f"progress.{key}": value for key, value in progress.items()}}
+    )
+
+
+async def start_job(db, kind: str, work, params: dict = None, timeout: float = None) -> dict:
+    """Record a new job and run `work(job_id)` in the background.
+
+    `work` is an async callable; whatever dict it returns is stored as the
+    job's `result`. Exceptions mark the job failed, as does running past
+    `timeout` seconds; a job whose worker dies is reported failed once its
+    deadline has passed.
+    """
+    # Past the deadline, pollers give up on the worker; until then its own timeout reports the failure
+    deadline = datetime.now(timezone.utc) + timedelta(seconds=timeout) + DEADLINE_SLACK if timeout else None
+    job = {
+        "_id": uuid.uuid4().hex,
+        "kind": kind,
+        "params": params or {},
+        "status": "pending",
+        "progress": {},
+        "result": None,
+        "error": None,
+        "created_at": _now(),
+        "deadline": deadline.isoformat() if deadline else None,
+        "finished_at": None,
+    }
+    await db.jobs.insert_one(job)
+
+    async def run():
+        await db.jobs.update_one({"_id": job["_id"]}, {"$set": {"status": "running", "started_at": _now()}})
+        try:
+            result = await asyncio.wait_for(work(job["_id"]), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"{kind} job {job['_id']} timed out after {timeout}s")
+            await db.jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": "failed", "error": f"Timed out after {timeout}s", "finished_at": _now()}}
+            )
+        except Exception as e:
+            logger.exception(f"{kind} job {job['_id']} failed")
+            await db.jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": "failed", "error": str(e), "finished_at": _now()}}
+            )
+        else:
+            await db.jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": "done", "result": result, "finished_at": _now()}}
+            )
+
+    task = asyncio.create_task(run())
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+    return job
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Job thread pool, sized by JOB_WORKERS on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("JOB_WORKERS", "2")),
+            thread_name_prefix="job"
+        )
+    return _executor
+
+
+async def run_in_pool(fn, *args):
+    """Run a blocking function on the job thread pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), fn, *args)
+
+
+# Leases
+# A lease is a document in `locks` naming its owner and an expiry. Only one
+# worker can hold it at a time; if the holder dies the lease simply expires.
+async def acquire_lease(db, name: str, owner: str, ttl: timedelta) -> bool:
+    """Take or renew the lease `name`; False if another live owner holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.locks.find_one_and_update(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expires_at": now + ttl}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease exists and is held by someone else, so the upsert collided
+        return False
+    return True
+
+
+async def take_lease(db, name: str, owner: str, ttl: timedelta) -> bool:
+    """Take the lease `name` only if nobody, including `owner`, holds it now.
+
+    Unlike acquire_lease this never renews, so a worker cannot start the same
+    exclusive work twice; renew with keep_lease once taken.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        await db.locks.find_one_and_update(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + ttl}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def release_lease(db, name: str, owner: str):
+    await db.locks.delete_one({"_id": name, "owner": owner})
+
+
+async def lease_holder(db, name: str):
+    """Current owner of an unexpired lease, or None"""
+    lease = await db.locks.find_one({"_id": name, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+    return lease["owner"] if lease else None
+
+
+async def keep_lease(db, name: str, owner: str, ttl: timedelta):
+    """Renew a held lease until cancelled"""
+    while True:
+        await asyncio.sleep(ttl.total_seconds() / 3)
+        await acquire_lease(db, name, owner, ttl)
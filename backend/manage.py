@@ -0,0 +1,136 @@
+"""Maintenance commands for the library backend.
+
+Usage:
+    python manage.py rebuild-stats
+    python manage.py migrate-dates [--batch-size N]
+    python manage.py sweep-fines
+    python manage.py archive [--older-than-days N] [--batch-size N]
+    python manage.py snapshot [--full]
+    python manage.py import [--books PATH_OR_URL] [--users ...] [--transactions ...] [--chunk-size N] [--force]
+    python manage.py repair-transaction-ids
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+
+import server
+
+
+async def rebuild_stats(args):
+    stats = await server.rebuild_dashboard_stats()
+    for key, value in stats.items():
+        if key != "_id":
+            print(f"{key}: {value}")
+
+
+async def migrate_dates(args):
+    async def progress(converted):
+        print(f"transactions: {converted} converted")
+
+    await server.ensure_indexes()
+    converted = await server.migrate_transaction_dates(args.batch_size, progress=progress)
+    print(f"Converted dates on {converted} transactions")
+
+
+async def sweep_fines(args):
+    await server.ensure_indexes()
+    updated = await server.sweep_accrued_fines()
+    print(f"Updated accrued fines on {updated} open loans")
+
+
+async def archive(args):
+    async def progress(archived):
+        print(f"transactions: {archived} archived")
+
+    await server.ensure_indexes()
+    result = await server.archive_transactions(
+        timedelta(days=args.older_than_days), args.batch_size, progress=progress
+    )
+    print(f"Archived {result['archived']} transactions; rolled up {', '.join(result['months']) or 'no months'}")
+
+
+async def refresh_snapshot(args):
+    manifest = await server.refresh_snapshot(full=args.full)
+    print(f"Snapshot refreshed at {manifest['refreshed_at']} ({len(manifest['closed_parts'])} closed parts)")
+
+
+async def import_data(args):
+    sources = {
+        collection: getattr(args, collection)
+        for collection in ("books", "users", "transactions")
+        if getattr(args, collection)
+    }
+
+    async def progress(collection, rows_done):
+        print(f"{collection}: {rows_done} rows")
+
+    await server.ensure_indexes()
+    imported = await server.import_initial_data(
+        sources, chunk_size=args.chunk_size, force=args.force, progress=progress
+    )
+    for collection, count in imported.items():
+        print(f"Imported {count} {collection}")
+
+
+async def repair_transaction_ids(args):
+    renamed = await server.repair_duplicate_transaction_ids()
+    print(f"Renamed {renamed} transactions with duplicate IDs")
+    failed = await server.ensure_indexes()
+    for index in failed:
+        print(f"Index still missing: {index}")
+    if not failed:
+        print("All indexes in place")
+
+
+COMMANDS = {
+    "rebuild-stats": rebuild_stats,
+    "migrate-dates": migrate_dates,
+    "sweep-fines": sweep_fines,
+    "archive": archive,
+    "snapshot": refresh_snapshot,
+    "import": import_data,
+    "repair-transaction-ids": repair_transaction_ids,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild-stats", help="Recompute the dashboard counters from scratch")
+
+    migrate_parser = subparsers.add_parser(
+        "migrate-dates", help="Convert ISO-string transaction dates to native UTC datetimes (online, re-runnable)"
+    )
+    migrate_parser.add_argument("--batch-size", type=int, default=server.IMPORT_BATCH_SIZE)
+    subparsers.add_parser("sweep-fines", help="Bring accrued fines on open loans up to date now")
+
+    archive_parser = subparsers.add_parser(
+        "archive", help="Move old returned transactions into monthly archive collections"
+    )
+    archive_parser.add_argument("--older-than-days", type=int, default=server.ARCHIVE_AFTER_DAYS)
+    archive_parser.add_argument("--batch-size", type=int, default=server.ARCHIVE_BATCH_SIZE)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="Refresh the columnar analytics snapshot")
+    snapshot_parser.add_argument("--full", action="store_true", help="Rebuild from scratch instead of appending")
+
+    import_parser = subparsers.add_parser(
+        "import", help="Load books, users and transactions from CSV (resumes an interrupted load)"
+    )
+    for collection in ("books", "users", "transactions"):
+        import_parser.add_argument(f"--{collection}", help=f"CSV path or URL for {collection} (default: bundled dataset)")
+    import_parser.add_argument("--chunk-size", type=int, default=server.IMPORT_CHUNK_SIZE)
+    import_parser.add_argument("--force", action="store_true", help="Reload from the first row, ignoring checkpoints")
+    subparsers.add_parser(
+        "repair-transaction-ids",
+        help="Rename loans with duplicate transaction IDs so the unique index can be built"
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(COMMANDS[args.command](args))
+    finally:
+        server.client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Minimal Prometheus-style metrics: counters, gauges and histograms with labels.
+
+Values are kept per process and rendered in the Prometheus text exposition
+format by `/metrics`. Updates may come from the event loop, the job pool or
+pymongo's monitoring threads, so every metric takes a lock.
+"""
+import threading
+
+from pymongo import monitoring
+
+# Prometheus' default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def samples(self):
+        """(suffix, label string, value) for every series"""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            yield "", _format_labels(self.labels, key), value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        super().__init__(registry, name, help, labels)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return series["count"] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, {**series, "buckets": list(series["buckets"])}) for key, series in self._values.items()]
+        for key, series in sorted(items):
+            for bound, count in zip(self.buckets, series["buckets"]):
+                yield "_bucket", _format_labels(self.labels, key, f'le="{_format_value(bound)}"'), count
+            yield "_sum", _format_labels(self.labels, key), series["sum"]
+            yield "_count", _format_labels(self.labels, key), series["count"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return Counter(self, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels=()) -> Gauge:
+        return Gauge(self, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return Histogram(self, name, help, labels, buckets)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+class CommandTimer(monitoring.CommandListener):
+    """pymongo listener timing every command, labelled by collection and operation"""
+
+    def __init__(self, histogram: Histogram, failures: Counter):
+        self.histogram = histogram
+        self.failures = failures
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command = event.command
+        # find/aggregate/insert/... name their collection as the command's value
+        collection = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                collection if isinstance(collection, str) else "", event.command_name
+            )
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), ("", event.command_name))
+
+    def succeeded(self, event):
+        collection, operation = self._finish(event)
+        self.histogram.observe(event.duration_micros / 1e6, collection=collection, operation=operation)
+
+    def failed(self, event):
+        collection, operation = self._finish(event)
+        self.histogram.observe(event.duration_micros / 1e6, collection=collection, operation=operation)
+        self.failures.inc(collection=collection, operation=operation)
@@ -1,33 +1,147 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
 from dotenv import load_dotenv
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, TEXT, InsertOne, ReplaceOne, UpdateOne
+from contextlib import asynccontextmanager
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 import os
 import logging
+import base64
+import json
+import tempfile
+import socket
+import time
+import cProfile
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, AfterValidator, PlainSerializer, TypeAdapter, model_validator
+from typing import TYPE_CHECKING, Annotated, List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 import httpx
-import pandas as pd
-import numpy as np
-from io import BytesIO
-import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill
+import asyncio
+import heapq
+import functools
+from bson import ObjectId, json_util
+# pandas, numpy and openpyxl are imported inside the functions that need them
+# (fines, import, reports) so workers boot fast and stay small until then.
+if TYPE_CHECKING:
+    import numpy as np
+
+import events
+import jobs
+import metrics
+import snapshot
+from cache import SingleFlight, TTLCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
+# Connection pool tuning, e.g. MONGO_MAX_POOL_SIZE=50 per worker process
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": "MONGO_MAX_POOL_SIZE",
+    "minPoolSize": "MONGO_MIN_POOL_SIZE",
+    "maxIdleTimeMS": "MONGO_MAX_IDLE_TIME_MS",
+    "waitQueueTimeoutMS": "MONGO_WAIT_QUEUE_TIMEOUT_MS",
+    "connectTimeoutMS": "MONGO_CONNECT_TIMEOUT_MS",
+    "socketTimeoutMS": "MONGO_SOCKET_TIMEOUT_MS",
+    "serverSelectionTimeoutMS": "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+}
+
+# Metrics, served in Prometheus text format by /metrics; each worker process
+# keeps and reports its own.
+registry = metrics.Registry()
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Time until the response starts, by route", ["method", "route", "status"]
+)
+REQUESTS_IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requests being handled", ["method", "route"])
+MONGO_COMMAND_DURATION = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trips", ["collection", "operation"]
+)
+MONGO_COMMAND_FAILURES = registry.counter(
+    "mongodb_command_failures_total", "MongoDB commands that failed", ["collection", "operation"]
+)
+ANALYTICS_SCANNED = registry.counter(
+    "library_analytics_documents_scanned_total",
+    "Loans (MongoDB documents or snapshot rows) read to compute analytics", ["endpoint", "source"]
+)
+ANALYTICS_RETURNED = registry.counter(
+    "library_analytics_rows_returned_total", "Rows produced by analytics computations", ["endpoint", "source"]
+)
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[
+    metrics.CommandTimer(MONGO_COMMAND_DURATION, MONGO_COMMAND_FAILURES)
+], **{
+    option: int(os.environ[variable])
+    for option, variable in MONGO_CLIENT_OPTIONS.items()
+    if os.environ.get(variable)
+})
 db = client[os.environ['DB_NAME']]
 
-app = FastAPI()
+# Identifies this worker process when taking leases
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+IMPORT_LEASE = "data-import"
+IMPORT_LEASE_TTL = timedelta(seconds=int(os.environ.get('IMPORT_LEASE_SECONDS', '60')))
+
+# Per-worker readiness, reported by /health/ready
+readiness = {"indexes": False}
+# Seconds between attempts at index creation and the startup import until both succeed
+SETUP_RETRY_SECONDS = int(os.environ.get('SETUP_RETRY_SECONDS', '30'))
+# The import job this worker is running, if any
+running_import = {"job_id": None}
+
+REPORTS_DIR = Path(os.environ.get('REPORTS_DIR', Path(tempfile.gettempdir()) / 'library_reports'))
+REPORT_RETENTION = timedelta(hours=int(os.environ.get('REPORT_RETENTION_HOURS', '24')))
+# Report jobs still unfinished after this long are marked failed
+REPORT_JOB_TIMEOUT = int(os.environ.get('REPORT_JOB_TIMEOUT_SECONDS', '600'))
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Read cache for catalog lookups and analytics; CACHE_ENABLED=0 turns it off (e.g. in tests)
+cache = TTLCache(
+    maxsize=int(os.environ.get('CACHE_MAX_ENTRIES', '1024')),
+    ttl=float(os.environ.get('CACHE_TTL_SECONDS', '30')),
+    enabled=os.environ.get('CACHE_ENABLED', '1').lower() not in ('0', 'false', 'no')
+)
+flights = SingleFlight()
+# Circulation and catalog writes, for the live dashboard feed
+bus = events.EventBus()
+
+async def load_shared(key: str, loader):
+    """Serve `key` from the cache, coalescing concurrent misses into one `loader()` call"""
+    hit, value = cache.get(key)
+    if hit:
+        return value
+    # A load started before a write neither gets cached nor serves callers arriving after it
+    generation = cache.generation
+    value = await flights.do((key, generation), loader)
+    cache.set(key, value, generation)
+    return value
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Setup runs in the background so the app serves (and reports itself
+    # unready) even while MongoDB is unreachable
+    background = [asyncio.create_task(run_database_setup())]
+    if FINE_SWEEP_INTERVAL > 0:
+        background.append(asyncio.create_task(run_fine_sweeper()))
+    if SNAPSHOT_REFRESH_INTERVAL > 0:
+        background.append(asyncio.create_task(run_snapshot_refresher()))
+    logger.info("Application started")
+    yield
+    for task in background:
+        task.cancel()
+    dashboard_feed.close()
+    client.close()
+
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
 # Configuration
+# Default fine policy, in force until a first version is saved (see Fine Policies)
 FINE_CONFIG = {
     "grace_period_days": 5,
     "tiers": [
@@ -37,6 +151,51 @@ FINE_CONFIG = {
     ]
 }
 
+# Dates
+# Transaction dates are stored as native BSON datetimes in UTC. pymongo hands
+# them back naive, so naive datetimes are UTC throughout; the API renders them
+# as ISO 8601 strings with an explicit offset.
+DATE_FIELDS = ("issue_date", "due_date", "return_date")
+
+def utc_now() -> datetime:
+    """Current UTC time as a naive datetime, truncated to BSON's millisecond precision"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def to_utc(value) -> Optional[datetime]:
+    """Parse an ISO string or datetime into a naive UTC datetime; None for missing values.
+
+    Values without an offset are taken as UTC.
+    """
+    if value is None or isinstance(value, float) or value != value:
+        # None, NaN and NaT
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def iso_utc(value) -> Optional[str]:
+    """ISO 8601 rendering of a stored date, e.g. 2024-01-15T09:30:00+00:00"""
+    if type(value) is datetime and value.tzinfo is None:
+        # Stored dates: already naive UTC
+        return value.isoformat() + "+00:00"
+    value = to_utc(value)
+    return value.replace(tzinfo=timezone.utc).isoformat() if value else None
+
+def json_default(value):
+    """json.dumps fallback for documents read straight from MongoDB"""
+    if isinstance(value, datetime):
+        return iso_utc(value)
+    return str(value)
+
+# Accepts datetimes or ISO strings, serializes as ISO with a UTC offset
+UTCDateTime = Annotated[datetime, AfterValidator(to_utc), PlainSerializer(iso_utc, return_type=str)]
+
 # Models
 class Book(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -79,11 +238,13 @@ class Transaction(BaseModel):
     transaction_id: str
     book_id: str
     user_id: str
-    issue_date: str
-    return_date: Optional[str] = None
-    due_date: str
+    issue_date: UTCDateTime
+    return_date: Optional[UTCDateTime] = None
+    due_date: UTCDateTime
     status: str
     fine_amount: float = 0.0
+    accrued_fine: float = 0.0
+    overdue_days: int = 0
 
 class TransactionCreate(BaseModel):
     book_id: str
@@ -93,15 +254,52 @@ class TransactionCreate(BaseModel):
 class TransactionReturn(BaseModel):
     transaction_id: str
 
+class BulkIssueRequest(BaseModel):
+    items: List[TransactionCreate] = Field(..., min_length=1, max_length=1000)
+
+class BulkReturnRequest(BaseModel):
+    items: List[TransactionReturn] = Field(..., min_length=1, max_length=1000)
+
+class FineTier(BaseModel):
+    days_start: int = Field(..., ge=1)
+    days_end: Optional[int] = None
+    rate_per_day: float = Field(..., ge=0)
+
+class FinePolicyCreate(BaseModel):
+    grace_period_days: int = Field(5, ge=0)
+    tiers: List[FineTier] = Field(..., min_length=1, max_length=20)
+    note: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_tiers(self):
+        """Tiers must be in order and not overlap; only the last may be open-ended"""
+        previous_end = 0
+        for i, tier in enumerate(self.tiers):
+            if tier.days_start <= previous_end:
+                raise ValueError("tiers must be in order and must not overlap")
+            if tier.days_end is None:
+                if i != len(self.tiers) - 1:
+                    raise ValueError("only the last tier may be open-ended")
+            elif tier.days_end < tier.days_start:
+                raise ValueError("days_end must not be before days_start")
+            previous_end = tier.days_end
+        return self
+
+class FinePolicy(FinePolicyCreate):
+    model_config = ConfigDict(extra="ignore")
+    version: int
+    created_at: Optional[UTCDateTime] = None
+
+class FineSimulationRequest(BaseModel):
+    policies: List[FinePolicyCreate] = Field(..., min_length=1, max_length=10)
+    # Open loans are priced as if returned at this time (default: now)
+    as_of: Optional[UTCDateTime] = None
+
 # Helper Functions
-def calculate_fine(due_date_str: str, return_date_str: Optional[str], grace_period: int = 5) -> float:
+def calculate_fine(due_date, return_date, grace_period: int = 5, tiers: Optional[list] = None) -> float:
     """Calculate fine based on tiered policy with grace period"""
-    due_date = datetime.fromisoformat(due_date_str).replace(tzinfo=None)
-    
-    if return_date_str and return_date_str.strip():
-        return_date = datetime.fromisoformat(return_date_str).replace(tzinfo=None)
-    else:
-        return_date = datetime.now(timezone.utc).replace(tzinfo=None)
+    due_date = to_utc(due_date)
+    return_date = to_utc(return_date) or utc_now()
     
     if return_date <= due_date:
         return 0.0
@@ -111,10 +309,13 @@ def calculate_fine(due_date_str: str, return_date_str: Optional[str], grace_peri
     if overdue_days <= grace_period:
         return 0.0
     
-    chargeable_days = overdue_days - grace_period
+    return tiered_fine(overdue_days - grace_period, tiers)
+
+def tiered_fine(chargeable_days: int, tiers: Optional[list] = None) -> float:
+    """Fine for `chargeable_days` past the grace period, tier by tier, rounded to paise"""
     total_fine = 0.0
     
-    for tier in FINE_CONFIG["tiers"]:
+    for tier in FINE_CONFIG["tiers"] if tiers is None else tiers:
         start = tier["days_start"]
         end = tier["days_end"] if tier["days_end"] else float('inf')
         rate = tier["rate_per_day"]
@@ -130,445 +331,2053 @@ def calculate_fine(due_date_str: str, return_date_str: Optional[str], grace_peri
     
     return round(total_fine, 2)
 
-async def import_initial_data():
-    """Import data from CSV URLs into MongoDB"""
-    books_url = "https://customer-assets.emergentagent.com/job_5edf4d13-8af0-4ee5-a665-c1ddf41e0200/artifacts/d40kxosw_Datasets%20-%20books.csv.csv"
-    users_url = "https://customer-assets.emergentagent.com/job_5edf4d13-8af0-4ee5-a665-c1ddf41e0200/artifacts/n8l5t7yt_Datasets%20-%20users.csv.csv"
-    transactions_url = "https://customer-assets.emergentagent.com/job_5edf4d13-8af0-4ee5-a665-c1ddf41e0200/artifacts/a8soib4o_Datasets%20-%20transactions.csv.csv"
+def to_naive_datetime64(values) -> "np.ndarray":
+    """Convert dates (ISO strings, datetimes or datetime64) to naive UTC datetime64[us].
+
+    Like calculate_fine, values with an offset are converted to UTC and naive
+    values are taken as UTC. Missing values become NaT.
+    """
+    import numpy as np
+    
+    # numpy arrays and pandas Series/Index that are already datetimes
+    dtype = getattr(values, "dtype", None)
+    if isinstance(dtype, np.dtype) and np.issubdtype(dtype, np.datetime64):
+        return np.asarray(values, dtype="datetime64[us]")
+
+    def naive_utc(value):
+        if isinstance(value, str):
+            value = value.strip()
+            if len(value) > 10:
+                # UTC strings are trimmed and left to numpy's fast parser
+                if value[-1] == "Z":
+                    return value[:-1]
+                if value[-6] in "+-" and value[-3] == ":":
+                    return value[:-6] if value[-5:] == "00:00" else to_utc(value)
+            return value or "NaT"
+        return to_utc(value) or "NaT"
+
+    return np.array([naive_utc(value) for value in values], dtype="datetime64[us]")
+
+def calculate_fines_batch(due_dates, return_dates, grace_period: int = 5,
+                          now: Optional[datetime] = None, tiers: Optional[list] = None) -> "np.ndarray":
+    """Vectorized calculate_fine over arrays of due/return dates.
+
+    Missing return dates are priced against `now` (default: current UTC time),
+    exactly as calculate_fine does for open loans.
+    """
+    import numpy as np
     
+    due = to_naive_datetime64(due_dates)
+    returned = to_naive_datetime64(return_dates)
+    now = to_utc(now) or utc_now()
+    returned = np.where(np.isnat(returned), np.datetime64(now, "us"), returned)
+
+    overdue_days = np.zeros(len(due), dtype=np.int64)
+    valid = ~np.isnat(due)
+    overdue_days[valid] = (returned[valid] - due[valid]) // np.timedelta64(1, "D")
+    chargeable_days = np.where(overdue_days > grace_period, overdue_days - grace_period, 0)
+
+    # Loans share a few hundred distinct day counts; pricing each one with
+    # tiered_fine keeps batch fines identical to calculate_fine's, float sums
+    # and rounding included, which np.round over a vectorized sum is not
+    days, position = np.unique(chargeable_days, return_inverse=True)
+    fines = np.array([tiered_fine(int(day), tiers) for day in days], dtype=np.float64)
+    return fines[position.reshape(-1)]
+
+def new_transaction_id() -> str:
+    """Collision-free, time-ordered transaction ID.
+
+    Built on a BSON ObjectId: timestamp prefix, per-process random value and
+    an incrementing counter, so IDs never repeat across workers or within the
+    same second and sort in issue order.
+    """
+    return f"T{ObjectId()}"
+
+async def get_cached_document(collection: str, key: str, value: str) -> Optional[dict]:
+    """Book/user document by ID, served from the read cache when possible"""
+    cache_key = f"{collection[:-1]}:{value}"
+    async def load():
+        return await db[collection].find_one({key: value}, {"_id": 0})
+    # Don't remember misses; the document may be created in a moment
+    return await cache.get_or_load(cache_key, load, cache_none=False)
+
+async def get_cached_user(user_id: str) -> Optional[dict]:
+    return await get_cached_document("users", "user_id", user_id)
+
+async def get_cached_book(book_id: str) -> Optional[dict]:
+    return await get_cached_document("books", "book_id", book_id)
+
+def encode_cursor(values: list) -> str:
+    """Opaque pagination cursor holding the sort key of the last row returned"""
+    # Extended JSON so datetimes in the sort key round-trip as datetimes
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str, size: int = None) -> list:
     try:
-        async with httpx.AsyncClient() as client_http:
-            # Import Books
-            books_count = await db.books.count_documents({})
-            if books_count == 0:
-                response = await client_http.get(books_url)
-                books_df = pd.read_csv(BytesIO(response.content))
-                books_df['shelf_location'] = 'A1'
-                books_data = books_df.to_dict('records')
-                if books_data:
-                    await db.books.insert_many(books_data)
-                    logger.info(f"Imported {len(books_data)} books")
-            
-            # Import Users with departments
-            users_count = await db.users.count_documents({})
-            if users_count == 0:
-                response = await client_http.get(users_url)
-                users_df = pd.read_csv(BytesIO(response.content))
-                departments = ['Computer Science', 'Electronics', 'Mechanical', 'Civil', 'MBA', 'Arts']
-                semesters = ['1', '2', '3', '4', '5', '6', '7', '8']
-                users_df['department'] = np.random.choice(departments, len(users_df))
-                users_df['semester'] = np.random.choice(semesters, len(users_df))
-                # Convert phone to string
-                users_df['phone'] = users_df['phone'].astype(str)
-                users_data = users_df.to_dict('records')
-                if users_data:
-                    await db.users.insert_many(users_data)
-                    logger.info(f"Imported {len(users_data)} users")
-            
-            # Import Transactions
-            trans_count = await db.transactions.count_documents({})
-            if trans_count == 0:
-                response = await client_http.get(transactions_url)
-                trans_df = pd.read_csv(BytesIO(response.content))
-                trans_df['status'] = trans_df['return_date'].apply(
-                    lambda x: 'returned' if pd.notna(x) and str(x).strip() else 'issued'
-                )
-                trans_df['fine_amount'] = trans_df.apply(
-                    lambda row: calculate_fine(
-                        row['due_date'],
-                        str(row['return_date']) if pd.notna(row['return_date']) else None,
-                        FINE_CONFIG['grace_period_days']
-                    ), axis=1
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or (size and len(values) != size):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def after_key(keys: list, values: list) -> dict:
+    """Query matching rows that sort strictly after `values` on the compound key `keys`"""
+    if len(keys) == 1:
+        return {keys[0]: {"$gt": values[0]}}
+    return {"$or": [
+        {**dict(zip(keys[:i], values[:i])), keys[i]: {"$gt": values[i]}}
+        for i in range(len(keys))
+    ]}
+
+INDEXES = {
+    "books": [
+        ([("book_id", ASCENDING)], {"unique": True}),
+        ([("genre", ASCENDING)], {}),
+        ([("title", TEXT), ("author", TEXT)], {"name": "books_search"}),
+    ],
+    "users": [
+        ([("user_id", ASCENDING)], {"unique": True}),
+        ([("department", ASCENDING)], {}),
+        ([("name", TEXT), ("email", TEXT)], {"name": "users_search"}),
+    ],
+    "transactions": [
+        ([("transaction_id", ASCENDING)], {"unique": True}),
+        ([("status", ASCENDING), ("due_date", ASCENDING), ("transaction_id", ASCENDING)], {}),
+        ([("user_id", ASCENDING), ("status", ASCENDING)], {}),
+        ([("book_id", ASCENDING)], {}),
+        ([("issue_date", ASCENDING), ("transaction_id", ASCENDING)], {}),
+        ([("status", ASCENDING), ("next_accrual_at", ASCENDING)], {}),
+        ([("status", ASCENDING), ("return_date", ASCENDING)], {}),
+    ],
+    "transaction_rollups": [
+        ([("month", ASCENDING)], {}),
+    ],
+}
+
+# Responses
+# FAST_RESPONSES=1 renders list and analytics responses in one pass instead of
+# FastAPI's validate, convert to JSON-able dicts, then json.dumps. List rows
+# are validated and dumped straight to JSON by pydantic-core through a
+# TypeAdapter (the same output as their response_model); analytics rows, which
+# this module builds itself, skip validation and go to orjson, which also
+# handles numpy values natively.
+FAST_RESPONSES = os.environ.get('FAST_RESPONSES', '0').lower() in ('1', 'true', 'yes')
+
+class FastJSONResponse(JSONResponse):
+    """JSON rendered by orjson; naive datetimes are UTC"""
+    def render(self, content) -> bytes:
+        import orjson
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY)
+
+@functools.lru_cache(maxsize=None)
+def list_adapter(model) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+def fast_response(content, response: Response, model=None):
+    """`content` pre-rendered as JSON when FAST_RESPONSES is on, otherwise unchanged.
+
+    With a `model`, content is a list of rows validated against it. Headers
+    already set on `response` (cursors, snapshot age) are carried over.
+    """
+    if not FAST_RESPONSES or isinstance(content, Response):
+        return content
+    headers = {name: value for name, value in response.headers.items() if name.startswith("x-")}
+    if model is None:
+        return FastJSONResponse(content, headers=headers)
+    adapter = list_adapter(model)
+    return Response(adapter.dump_json(adapter.validate_python(content)), media_type="application/json", headers=headers)
+
+# List endpoints page through results in order of their unique, indexed ID
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+
+def ndjson_response(cursor) -> StreamingResponse:
+    """Stream a Motor cursor as newline-delimited JSON, one document per line"""
+    async def rows():
+        if FAST_RESPONSES:
+            import orjson
+            option = orjson.OPT_NAIVE_UTC | orjson.OPT_APPEND_NEWLINE
+            async for doc in cursor:
+                yield orjson.dumps(doc, default=json_default, option=option)
+        else:
+            async for doc in cursor:
+                yield json.dumps(doc, default=json_default) + "\n"
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+async def paginate(collection, query: dict, key, response: Response,
+                   limit: Optional[int], after: Optional[str], stream: bool):
+    """Keyset pagination on `key`; the next page's cursor goes in the X-Next-Cursor header.
+
+    `key` is a field name, or a list of fields ending in a unique one for a
+    compound sort order. With `stream`, every matching row (up to `limit`, if
+    given) is streamed as NDJSON straight off the cursor instead of being
+    buffered into a page.
+    """
+    keys = [key] if isinstance(key, str) else list(key)
+    if after:
+        query = {**query, **after_key(keys, decode_cursor(after, len(keys)))}
+    cursor = collection.find(query, {"_id": 0}).sort([(field, ASCENDING) for field in keys])
+    if stream:
+        return ndjson_response(cursor.limit(limit or 0))
+    
+    limit = limit or DEFAULT_PAGE_SIZE
+    docs = await cursor.limit(limit).to_list(limit)
+    if len(docs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor([docs[-1][field] for field in keys])
+    return docs
+
+async def ensure_indexes() -> list:
+    """Create the indexes backing the hot queries (idempotent); returns the ones that failed"""
+    failed = []
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                # e.g. duplicates already present for a unique key; keep serving
+                logger.error(f"Could not create index {keys} on {collection}: {e}")
+                failed.append(f"{collection}: {keys}")
+            except PyMongoError as e:
+                # Unreachable database: every remaining index would wait out the same timeout
+                logger.error(f"Could not create indexes: {e}")
+                return [f"{name}: {spec}" for name, specs in INDEXES.items() for spec, _ in specs]
+    return failed
+
+async def repair_duplicate_transaction_ids() -> int:
+    """Give fresh IDs to loans that share a transaction_id; returns how many were renamed.
+
+    Older versions could mint the same ID twice, which blocks the unique
+    index. The loan written first keeps its ID.
+    """
+    duplicates = db.transactions.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$transaction_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True)
+    renamed = 0
+    async for group in duplicates:
+        for doc_id in group["ids"][1:]:
+            await db.transactions.update_one({"_id": doc_id}, {"$set": {"transaction_id": new_transaction_id()}})
+            renamed += 1
+    if renamed:
+        cache.invalidate(prefix="analytics:")
+    logger.info(f"Renamed {renamed} transactions with duplicate IDs")
+    return renamed
+
+# Aggregation Pipelines
+# Grouping happens server-side so only the top-N rows travel over the wire.
+# Transactions are grouped by key *before* the $lookup so each book/user is
+# joined once instead of once per loan.
+
+# Fine charged on a returned loan, or accrued so far on an open one
+FINE_OWED = {"$cond": [
+    {"$eq": ["$status", "issued"]},
+    {"$ifNull": ["$accrued_fine", 0]},
+    {"$ifNull": ["$fine_amount", 0]}
+]}
+# Loans a row stands for: 1 for a transaction, loan_count for an archive rollup
+LOAN_COUNT = {"$ifNull": ["$loan_count", 1]}
+
+def with_archive(pipeline: list, include: bool) -> list:
+    """Prefix a transactions pipeline with the archive rollups, when there are any"""
+    if not include:
+        return pipeline
+    return [{"$unionWith": {"coll": "transaction_rollups", "pipeline": [{"$project": {
+        "_id": 0, "user_id": 1, "book_id": 1, "loan_count": 1, "fine_amount": 1,
+        "status": {"$literal": "returned"}
+    }}]}}] + pipeline
+
+def top_borrowers_pipeline(limit: int) -> list:
+    """Users ranked by number of loans, with their total fines"""
+    return [
+        {"$group": {
+            "_id": "$user_id",
+            "loan_count": {"$sum": LOAN_COUNT},
+            "total_fines": {"$sum": FINE_OWED}
+        }},
+        {"$sort": {"loan_count": -1, "_id": 1}},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "users",
+            "localField": "_id",
+            "foreignField": "user_id",
+            "as": "user"
+        }},
+        {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id",
+            "loan_count": 1,
+            "total_fines": 1,
+            "name": "$user.name",
+            "email": "$user.email",
+            "department": "$user.department"
+        }}
+    ]
+
+def top_books_pipeline(limit: int) -> list:
+    """Books ranked by number of times borrowed"""
+    return [
+        {"$group": {"_id": "$book_id", "borrow_count": {"$sum": LOAN_COUNT}}},
+        {"$sort": {"borrow_count": -1, "_id": 1}},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "books",
+            "localField": "_id",
+            "foreignField": "book_id",
+            "as": "book"
+        }},
+        {"$unwind": {"path": "$book", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "_id": 0,
+            "book_id": "$_id",
+            "borrow_count": 1,
+            "title": "$book.title",
+            "author": "$book.author",
+            "genre": "$book.genre"
+        }}
+    ]
+
+def _grouped_by_joined_field(key: str, collection: str, field: str, accumulator: dict) -> list:
+    """Aggregate transactions per `key`, then re-group by `field` of the joined document"""
+    return [
+        {"$group": {"_id": f"${key}", "value": accumulator}},
+        {"$lookup": {
+            "from": collection,
+            "localField": "_id",
+            "foreignField": key,
+            "as": "joined"
+        }},
+        {"$unwind": "$joined"},
+        {"$match": {f"joined.{field}": {"$ne": None}}},
+        {"$group": {"_id": f"$joined.{field}", "value": {"$sum": "$value"}}},
+    ]
+
+def genre_distribution_pipeline() -> list:
+    """Number of loans per book genre, most borrowed first"""
+    return _grouped_by_joined_field("book_id", "books", "genre", {"$sum": LOAN_COUNT}) + [
+        {"$sort": {"value": -1, "_id": 1}},
+        {"$project": {"_id": 0, "genre": "$_id", "count": "$value"}}
+    ]
+
+def fines_by_department_pipeline() -> list:
+    """Total fines per borrower department"""
+    return _grouped_by_joined_field("user_id", "users", "department", {"$sum": FINE_OWED}) + [
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "Department": "$_id", "Total Fines": "$value"}}
+    ]
+
+def fines_by_genre_pipeline() -> list:
+    """Total fines per book genre"""
+    return _grouped_by_joined_field("book_id", "books", "genre", {"$sum": FINE_OWED}) + [
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "Genre": "$_id", "Total Fines": "$value"}}
+    ]
+
+FINE_TOTALS_PIPELINE = [
+    {"$group": {
+        "_id": None,
+        "total_fines": {"$sum": FINE_OWED},
+        "transaction_count": {"$sum": LOAN_COUNT}
+    }}
+]
+
+# Dashboard Counters
+# `/dashboard/stats` reads a single pre-aggregated document instead of scanning
+# the collections. Every write path bumps it with an atomic $inc; the document
+# can be recomputed from scratch with rebuild_dashboard_stats() if it drifts.
+DASHBOARD_STATS_ID = "dashboard"
+
+def borrow_duration_days(issue_date, return_date) -> int:
+    """Whole days between issue and return"""
+    return (to_utc(return_date) - to_utc(issue_date)).days
+
+async def bump_dashboard_stats(**deltas):
+    """Atomically apply counter deltas to the dashboard stats document"""
+    result = await db.dashboard_stats.update_one(
+        {"_id": DASHBOARD_STATS_ID},
+        {"$inc": deltas}
+    )
+    if not result.matched_count:
+        # No document yet (fresh or upgraded database): upserting the deltas
+        # alone would store partial counters, so count everything instead.
+        # The write being counted has already landed.
+        await rebuild_dashboard_stats()
+
+async def rebuild_dashboard_stats() -> dict:
+    """Recompute the dashboard counters from the source collections"""
+    stats = {
+        "total_books": await db.books.count_documents({}),
+        "total_users": await db.users.count_documents({}),
+        "total_transactions": 0,
+        "active_loans": 0,
+        "returned_loans": 0,
+        "total_fines": 0.0,
+        "accrued_fines": 0.0,
+        "total_borrow_days": 0,
+    }
+    
+    projection = {"_id": 0, "status": 1, "fine_amount": 1, "accrued_fine": 1, "issue_date": 1, "return_date": 1}
+    async for trans in db.transactions.find({}, projection):
+        stats["total_transactions"] += 1
+        if trans.get("status") == "issued":
+            stats["active_loans"] += 1
+            stats["accrued_fines"] += float(trans.get("accrued_fine") or 0)
+        else:
+            stats["total_fines"] += float(trans.get("fine_amount") or 0)
+        if trans.get("status") == "returned" and trans.get("return_date"):
+            stats["returned_loans"] += 1
+            stats["total_borrow_days"] += borrow_duration_days(trans["issue_date"], trans["return_date"])
+    
+    # Archived loans are all returned and survive as rollups
+    async for rollup in db.transaction_rollups.find({}, {"_id": 0, "loan_count": 1, "fine_amount": 1, "borrow_days": 1}):
+        stats["total_transactions"] += rollup["loan_count"]
+        stats["returned_loans"] += rollup["loan_count"]
+        stats["total_fines"] += rollup["fine_amount"]
+        stats["total_borrow_days"] += rollup["borrow_days"]
+    
+    stats["rebuilt_at"] = datetime.now(timezone.utc).isoformat()
+    await db.dashboard_stats.replace_one({"_id": DASHBOARD_STATS_ID}, stats, upsert=True)
+    logger.info("Rebuilt dashboard stats")
+    return stats
+
+# Fine Accrual
+# Open loans carry their running fine in `accrued_fine` and `overdue_days`,
+# kept current by a periodic sweep, so overdue views and totals are plain
+# reads. `next_accrual_at` is when a loan's overdue day count next changes:
+# each sweep selects only the loans past that point, which are exactly the
+# ones whose fine may have moved since they were last written.
+FINE_SWEEP_INTERVAL = int(os.environ.get('FINE_SWEEP_SECONDS', '300'))
+FINE_SWEEP_BATCH_SIZE = int(os.environ.get('FINE_SWEEP_BATCH_SIZE', '1000'))
+FINE_SWEEP_LEASE = "fine-sweep"
+
+def accrual_fields(due_dates, now: datetime, policy: Optional[dict] = None) -> dict:
+    """accrued_fine, overdue_days and next_accrual_at for open loans due on `due_dates`"""
+    import numpy as np
+    
+    policy = policy or FINE_CONFIG
+    due = to_naive_datetime64(due_dates)
+    with np.errstate(invalid="ignore"):
+        # Missing due dates come out as 0
+        overdue_days = np.maximum((np.datetime64(now, "us") - due) // np.timedelta64(1, "D"), 0)
+    return {
+        "accrued_fine": calculate_fines_batch(
+            due, np.full(len(due), np.datetime64("NaT"), dtype="datetime64[us]"),
+            policy["grace_period_days"], now=now, tiers=policy["tiers"]
+        ),
+        "overdue_days": overdue_days,
+        "next_accrual_at": due + (overdue_days + 1) * np.timedelta64(1, "D"),
+    }
+
+async def _apply_accruals(loans: list, now: datetime, policy: dict) -> int:
+    fields = accrual_fields([loan["due_date"] for loan in loans], now, policy)
+    result = await db.transactions.bulk_write([
+        UpdateOne({"_id": loan["_id"], "status": "issued"}, {"$set": {
+            "accrued_fine": float(fine),
+            "overdue_days": int(days),
+            "next_accrual_at": next_at.item(),
+        }})
+        for loan, fine, days, next_at in zip(
+            loans, fields["accrued_fine"], fields["overdue_days"], fields["next_accrual_at"]
+        )
+    ], ordered=False)
+    return result.modified_count
+
+async def sweep_accrued_fines(batch_size: int = FINE_SWEEP_BATCH_SIZE) -> int:
+    """Bring accrued fines on open loans up to date; returns the number of loans updated"""
+    now = utc_now()
+    policy = await current_fine_policy()
+    query = {
+        "status": "issued",
+        # Loans written before accrual tracking have no next_accrual_at yet
+        "$or": [{"next_accrual_at": {"$lte": now}}, {"next_accrual_at": None}],
+        "due_date": {"$ne": None},
+    }
+    updated = 0
+    batch = []
+    async for loan in db.transactions.find(query, {"_id": 1, "due_date": 1}).batch_size(batch_size):
+        batch.append(loan)
+        if len(batch) == batch_size:
+            updated += await _apply_accruals(batch, now, policy)
+            batch = []
+    if batch:
+        updated += await _apply_accruals(batch, now, policy)
+    
+    # Refresh the running total; returns between sweeps adjust it with $inc
+    totals = await db.transactions.aggregate([
+        {"$match": {"status": "issued"}},
+        {"$group": {"_id": None, "accrued_fines": {"$sum": "$accrued_fine"}}}
+    ]).to_list(None)
+    # No upsert: a missing document is rebuilt in full on the next read
+    await db.dashboard_stats.update_one(
+        {"_id": DASHBOARD_STATS_ID},
+        {"$set": {"accrued_fines": totals[0]["accrued_fines"] if totals else 0.0}}
+    )
+    if updated:
+        cache.invalidate(prefix="analytics:")
+        logger.info(f"Fine sweep updated {updated} open loans")
+    return updated
+
+async def run_fine_sweeper():
+    """Sweep every FINE_SWEEP_SECONDS on whichever worker holds the sweep lease"""
+    lease_ttl = timedelta(seconds=FINE_SWEEP_INTERVAL * 2)
+    while True:
+        try:
+            if await jobs.acquire_lease(db, FINE_SWEEP_LEASE, WORKER_ID, lease_ttl):
+                await sweep_accrued_fines()
+        except Exception:
+            logger.exception("Fine sweep failed")
+        await asyncio.sleep(FINE_SWEEP_INTERVAL)
+
+# Fine Policies
+# The grace period and tiers live in `fine_policies`, one document per version
+# (_id is the version number); saving a policy adds the next version and the
+# latest one is in force. FINE_CONFIG applies, as version 0, until a first
+# version is saved. Fines already charged on returns stay as charged; open
+# loans are re-accrued under a new policy by the next sweep.
+FINE_POLICY_KEY = "fine-policy"
+
+async def current_fine_policy() -> dict:
+    """The fine policy in force: the latest saved version, else FINE_CONFIG"""
+    async def load():
+        latest = await db.fine_policies.find_one({}, {"_id": 0}, sort=[("_id", -1)])
+        return latest or {"version": 0, **FINE_CONFIG}
+    return await load_shared(FINE_POLICY_KEY, load)
+
+async def save_fine_policy(policy: FinePolicyCreate) -> dict:
+    """Store `policy` as the next version and put it in force"""
+    while True:
+        latest = await db.fine_policies.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        version = (latest["_id"] if latest else 0) + 1
+        doc = {"_id": version, "version": version, **policy.model_dump(), "created_at": utc_now()}
+        try:
+            await db.fine_policies.insert_one(doc)
+            break
+        except DuplicateKeyError:
+            # Another writer saved this version first; take the next one
+            continue
+    cache.invalidate(FINE_POLICY_KEY)
+    # Accrued fines were priced under the previous policy; the next sweep reprices them all
+    await db.transactions.update_many({"status": "issued"}, {"$set": {"next_accrual_at": None}})
+    logger.info(f"Fine policy version {version} in force")
+    del doc["_id"]
+    return doc
+
+# Fine Simulation
+# /fines/simulate re-prices every loan, open, returned and archived, under
+# candidate policies. Loans are read once, in batches; each batch is priced
+# under every policy with calculate_fines_batch and folded into running totals,
+# so memory is bounded by the batch size rather than the loan history.
+FINE_SIMULATION_BATCH_SIZE = int(os.environ.get('FINE_SIMULATION_BATCH_SIZE', '50000'))
+
+def stored_datetime64(values) -> "np.ndarray":
+    """to_naive_datetime64 for dates read from MongoDB (naive UTC datetimes, or
+    None), parsed in bulk by pandas; anything else takes the general path"""
+    import pandas as pd
+
+    try:
+        index = pd.DatetimeIndex(values)
+    except (TypeError, ValueError):
+        return to_naive_datetime64(values)
+    if index.tz is not None:
+        return to_naive_datetime64(values)
+    return index.values.astype("datetime64[us]")
+
+class FineSimulation:
+    """Running fine totals per policy, overall and by department and genre"""
+
+    def __init__(self, policies: list, as_of: datetime):
+        import numpy as np
+
+        self.policies = policies
+        self.as_of = as_of
+        self.loans = 0
+        self.totals = np.zeros(len(policies))
+        self.fined = np.zeros(len(policies), dtype=np.int64)
+        # label -> [loan count, fines per policy]
+        self.groups = {"department": {}, "genre": {}}
+
+    def add(self, due_dates, return_dates, departments, genres):
+        """Price one batch of loans; open loans have no return date"""
+        import numpy as np
+
+        due = to_naive_datetime64(due_dates)
+        returned = to_naive_datetime64(return_dates)
+        fines = np.stack([
+            calculate_fines_batch(due, returned, policy["grace_period_days"],
+                                  now=self.as_of, tiers=policy["tiers"])
+            for policy in self.policies
+        ])
+        self.loans += len(due)
+        self.totals += fines.sum(axis=1)
+        self.fined += (fines > 0).sum(axis=1)
+        self._add_grouped(self.groups["department"], departments, fines)
+        self._add_grouped(self.groups["genre"], genres, fines)
+
+    def add_documents(self, loans: list, departments: dict, genres: dict):
+        """Price a batch of transaction documents, given user_id -> department and book_id -> genre"""
+        self.add(
+            stored_datetime64([loan.get("due_date") for loan in loans]),
+            stored_datetime64([loan.get("return_date") for loan in loans]),
+            [departments.get(loan.get("user_id")) for loan in loans],
+            [genres.get(loan.get("book_id")) for loan in loans],
+        )
+
+    @staticmethod
+    def _add_grouped(groups: dict, labels, fines):
+        import numpy as np
+        import pandas as pd
+
+        # Loans without a label (unknown user or book) count only towards the totals
+        codes, uniques = pd.factorize(np.asarray(labels, dtype=object))
+        known = codes >= 0
+        codes = codes[known]
+        counts = np.bincount(codes, minlength=len(uniques))
+        sums = np.stack([
+            np.bincount(codes, weights=policy_fines[known], minlength=len(uniques))
+            for policy_fines in fines
+        ], axis=1)
+        for label, count, row in zip(uniques, counts, sums):
+            group = groups.setdefault(label, [0, np.zeros(len(fines))])
+            group[0] += count
+            group[1] += row
+
+    def result(self) -> dict:
+        def grouped(field: str, i: int) -> list:
+            return [
+                {field: label, "loans": int(count), "total_fines": round(float(fines[i]), 2)}
+                for label, (count, fines) in sorted(self.groups[field].items())
+            ]
+
+        baseline = float(self.totals[0])
+        return {
+            "as_of": iso_utc(self.as_of),
+            "transactions": self.loans,
+            "policies": [
+                {
+                    "policy": policy,
+                    "total_fines": round(float(self.totals[i]), 2),
+                    "change": round(float(self.totals[i]) - baseline, 2),
+                    "fined_loans": int(self.fined[i]),
+                    "by_department": grouped("department", i),
+                    "by_genre": grouped("genre", i),
+                }
+                for i, policy in enumerate(self.policies)
+            ],
+        }
+
+def simulate_fines_over_table(table, simulation: FineSimulation,
+                              batch_size: int = FINE_SIMULATION_BATCH_SIZE) -> FineSimulation:
+    """Feed every loan in an analytics snapshot table to `simulation`"""
+    for batch in table.to_batches(max_chunksize=batch_size):
+        simulation.add(*[
+            batch.column(name).to_numpy(zero_copy_only=False)
+            for name in ("due_date", "return_date", "department", "genre")
+        ])
+    return simulation
+
+async def simulate_fines_over_mongo(simulation: FineSimulation,
+                                    batch_size: int = FINE_SIMULATION_BATCH_SIZE) -> FineSimulation:
+    """Feed every loan in `transactions` and the archive collections to `simulation`.
+
+    Each batch is priced on the job pool so the event loop keeps serving.
+    """
+    books = db.books.find({}, {"_id": 0, "book_id": 1, "genre": 1})
+    users = db.users.find({}, {"_id": 0, "user_id": 1, "department": 1})
+    genres = {book["book_id"]: book.get("genre") async for book in books}
+    departments = {user["user_id"]: user.get("department") async for user in users}
+
+    projection = {"_id": 0, "user_id": 1, "book_id": 1, "due_date": 1, "return_date": 1}
+    for name in ["transactions"] + await archive_collections():
+        cursor = db[name].find({}, projection).batch_size(batch_size)
+        while loans := await cursor.to_list(batch_size):
+            await jobs.run_in_pool(simulation.add_documents, loans, departments, genres)
+    return simulation
+
+# Archive
+# Returned loans older than ARCHIVE_AFTER_DAYS move out of `transactions` into
+# one collection per return month (transactions_archive_YYYY_MM), keeping the
+# hot collection down to circulating loans. `archive_months` lists the archive
+# collections; `transaction_rollups` keeps per-month, per-user, per-book loan
+# counts, fines and borrow days so analytics and dashboard rebuilds still
+# cover archived history.
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '365'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+ARCHIVE_INDEXES = [
+    ([("transaction_id", ASCENDING)], {"unique": True}),
+    ([("user_id", ASCENDING), ("transaction_id", ASCENDING)], {}),
+    ([("issue_date", ASCENDING), ("transaction_id", ASCENDING)], {}),
+]
+
+def archive_month(return_date: datetime) -> str:
+    return f"{return_date.year:04}-{return_date.month:02}"
+
+async def archive_collections() -> list:
+    """Names of the archive collections, oldest month first"""
+    return [month["collection"] async for month in db.archive_months.find({}, {"collection": 1}).sort("_id", ASCENDING)]
+
+async def has_archive() -> bool:
+    return await db.archive_months.find_one({}, {"_id": 1}) is not None
+
+async def rebuild_rollups(month: str) -> int:
+    """Recompute one archived month's rollups from its archive collection"""
+    catalog = await db.archive_months.find_one({"_id": month})
+    rollups = {}
+    projection = {"_id": 0, "user_id": 1, "book_id": 1, "fine_amount": 1, "issue_date": 1, "return_date": 1}
+    async for trans in db[catalog["collection"]].find({}, projection):
+        key = f"{month}:{trans['user_id']}:{trans['book_id']}"
+        rollup = rollups.setdefault(key, {
+            "_id": key, "month": month, "user_id": trans["user_id"], "book_id": trans["book_id"],
+            "loan_count": 0, "fine_amount": 0.0, "borrow_days": 0
+        })
+        rollup["loan_count"] += 1
+        rollup["fine_amount"] += float(trans.get("fine_amount") or 0)
+        rollup["borrow_days"] += borrow_duration_days(trans["issue_date"], trans["return_date"])
+    
+    # The archive only grows, so upserting every key replaces the month's rollups
+    if rollups:
+        await db.transaction_rollups.bulk_write([
+            ReplaceOne({"_id": key}, rollup, upsert=True) for key, rollup in rollups.items()
+        ], ordered=False)
+    await db.archive_months.update_one(
+        {"_id": month},
+        {"$set": {"rolled_up": True, "transactions": sum(r["loan_count"] for r in rollups.values())}}
+    )
+    return len(rollups)
+
+async def archive_transactions(older_than: timedelta = timedelta(days=ARCHIVE_AFTER_DAYS),
+                               batch_size: int = ARCHIVE_BATCH_SIZE, progress=None) -> dict:
+    """Move returned loans older than `older_than` into the monthly archive.
+
+    Loans are copied (idempotently) before they are deleted from the hot
+    collection, and a month is flagged until its rollups are rebuilt, so an
+    interrupted run loses nothing and the next run finishes the job.
+    """
+    cutoff = utc_now() - older_than
+    query = {"status": "returned", "return_date": {"$lt": cutoff}}
+    archived = 0
+    while True:
+        batch = await db.transactions.find(query, {"_id": 0}).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        
+        by_month = {}
+        for trans in batch:
+            by_month.setdefault(archive_month(trans["return_date"]), []).append(trans)
+        for month, loans in by_month.items():
+            collection = f"transactions_archive_{month.replace('-', '_')}"
+            if not await db.archive_months.find_one({"_id": month}, {"_id": 1}):
+                for keys, options in ARCHIVE_INDEXES:
+                    await db[collection].create_index(keys, **options)
+            await db.archive_months.update_one(
+                {"_id": month},
+                {"$set": {"rolled_up": False}, "$setOnInsert": {"collection": collection}},
+                upsert=True
+            )
+            await db[collection].bulk_write([
+                UpdateOne({"transaction_id": trans["transaction_id"]}, {"$setOnInsert": trans}, upsert=True)
+                for trans in loans
+            ], ordered=False)
+        
+        result = await db.transactions.delete_many({
+            "transaction_id": {"$in": [trans["transaction_id"] for trans in batch]},
+            "status": "returned"
+        })
+        archived += result.deleted_count
+        if progress:
+            await progress(archived)
+    
+    months = [month["_id"] async for month in db.archive_months.find({"rolled_up": False}, {"_id": 1})]
+    for month in months:
+        await rebuild_rollups(month)
+    if archived:
+        cache.invalidate(prefix="analytics:")
+    logger.info(f"Archived {archived} transactions")
+    return {"archived": archived, "months": months}
+
+async def paginate_with_archive(query: dict, keys: list, response: Response,
+                                limit: Optional[int], after: Optional[str]) -> list:
+    """Keyset page over the hot collection and every archive collection, merged in key order"""
+    if after:
+        query = {**query, **after_key(keys, decode_cursor(after, len(keys)))}
+    limit = limit or DEFAULT_PAGE_SIZE
+    sort = [(field, ASCENDING) for field in keys]
+    collections = [db.transactions] + [db[name] for name in await archive_collections()]
+    pages = await asyncio.gather(*[
+        collection.find(query, {"_id": 0}).sort(sort).limit(limit).to_list(limit)
+        for collection in collections
+    ])
+    def sort_key(doc):
+        return tuple(doc[field] for field in keys)
+    docs = list(heapq.merge(*pages, key=sort_key))[:limit]
+    if len(docs) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(list(sort_key(docs[-1])))
+    return docs
+
+# Analytics Snapshot
+# A columnar copy of loan history (see snapshot.py), refreshed every
+# SNAPSHOT_REFRESH_SECONDS by one worker per host. Analytics and reports read
+# it when it exists and fall back to aggregating in MongoDB otherwise; their
+# responses carry the snapshot's refresh time in X-Snapshot-At.
+SNAPSHOT_DIR = Path(os.environ.get('SNAPSHOT_DIR', Path(tempfile.gettempdir()) / 'library_snapshot')) / os.environ['DB_NAME']
+SNAPSHOT_REFRESH_INTERVAL = int(os.environ.get('SNAPSHOT_REFRESH_SECONDS', '600'))
+SNAPSHOT_LEASE = f"snapshot:{socket.gethostname()}"
+
+async def refresh_snapshot(full: bool = False) -> dict:
+    manifest = await snapshot.refresh(db, SNAPSHOT_DIR, await archive_collections(), full=full)
+    cache.invalidate(prefix="analytics:")
+    logger.info(f"Refreshed analytics snapshot ({len(manifest['closed_parts'])} closed parts)")
+    return manifest
+
+async def run_snapshot_refresher():
+    lease_ttl = timedelta(seconds=SNAPSHOT_REFRESH_INTERVAL * 2)
+    while True:
+        try:
+            if await jobs.acquire_lease(db, SNAPSHOT_LEASE, WORKER_ID, lease_ttl):
+                await refresh_snapshot()
+        except Exception:
+            logger.exception("Snapshot refresh failed")
+        await asyncio.sleep(SNAPSHOT_REFRESH_INTERVAL)
+
+def read_snapshot():
+    """(table, refreshed_at) for the current snapshot, or None if there is none"""
+    if SNAPSHOT_REFRESH_INTERVAL <= 0:
+        return None
+    # A refresh may delete the files of the manifest just read; retry once
+    for _ in range(2):
+        manifest = snapshot.read_manifest(SNAPSHOT_DIR)
+        if not manifest:
+            return None
+        try:
+            return snapshot.load_table(SNAPSHOT_DIR, manifest), iso_utc(manifest["refreshed_at"])
+        except FileNotFoundError:
+            continue
+    return None
+
+async def from_snapshot(compute, endpoint: Optional[str] = None):
+    """(compute(table), refreshed_at) on the job pool, or None without a snapshot.
+
+    With an `endpoint`, the rows read and returned are counted in the analytics metrics.
+    """
+    loaded = await jobs.run_in_pool(read_snapshot)
+    if loaded is None:
+        return None
+    table, refreshed_at = loaded
+    rows = await jobs.run_in_pool(compute, table)
+    if endpoint:
+        ANALYTICS_SCANNED.inc(table.num_rows, endpoint=endpoint, source="snapshot")
+        ANALYTICS_RETURNED.inc(len(rows), endpoint=endpoint, source="snapshot")
+    return rows, refreshed_at
+
+async def details_by_id(collection: str, key: str, ids: list, fields: list) -> dict:
+    docs = await db[collection].find({key: {"$in": ids}}, {"_id": 0, key: 1, **{f: 1 for f in fields}}).to_list(None)
+    return {doc[key]: doc for doc in docs}
+
+async def top_borrowers_from_snapshot(limit: int):
+    result = await from_snapshot(lambda table: snapshot.top_counts(table, "user_id", limit), "top-borrowers")
+    if result is None:
+        return None
+    rows, refreshed_at = result
+    users = await details_by_id("users", "user_id", [row["user_id"] for row in rows], ["name", "email", "department"])
+    return [
+        {"user_id": row["user_id"], "loan_count": row["count"], "total_fines": row["fines"],
+         **{field: users.get(row["user_id"], {}).get(field) for field in ("name", "email", "department")}}
+        for row in rows
+    ], refreshed_at
+
+async def top_books_from_snapshot(limit: int):
+    result = await from_snapshot(lambda table: snapshot.top_counts(table, "book_id", limit), "top-books")
+    if result is None:
+        return None
+    rows, refreshed_at = result
+    books = await details_by_id("books", "book_id", [row["book_id"] for row in rows], ["title", "author", "genre"])
+    return [
+        {"book_id": row["book_id"], "borrow_count": row["count"],
+         **{field: books.get(row["book_id"], {}).get(field) for field in ("title", "author", "genre")}}
+        for row in rows
+    ], refreshed_at
+
+async def genre_distribution_from_snapshot():
+    result = await from_snapshot(
+        lambda table: snapshot.totals_by(table, "genre", order_by_value=True), "genre-distribution"
+    )
+    if result is None:
+        return None
+    rows, refreshed_at = result
+    return [{"genre": row["genre"], "count": row["count"]} for row in rows], refreshed_at
+
+def fine_summary_from_table(table) -> dict:
+    return {
+        "totals": snapshot.fine_totals(table),
+        "departments": [
+            {"Department": row["department"], "Total Fines": row["fines"]}
+            for row in snapshot.totals_by(table, "department")
+        ],
+        "genres": [
+            {"Genre": row["genre"], "Total Fines": row["fines"]}
+            for row in snapshot.totals_by(table, "genre")
+        ],
+    }
+
+# Data Import
+# CSVs are read in chunks (URLs are first streamed to a temporary file) and
+# upserted in bounded batches keyed on each collection's ID, so a load runs in
+# constant memory and can be re-run safely. Progress is checkpointed per
+# collection in `import_checkpoints`, letting an interrupted load resume.
+DATA_SOURCES = {
+    "books": "https://customer-assets.emergentagent.com/job_5edf4d13-8af0-4ee5-a665-c1ddf41e0200/artifacts/d40kxosw_Datasets%20-%20books.csv.csv",
+    "users": "https://customer-assets.emergentagent.com/job_5edf4d13-8af0-4ee5-a665-c1ddf41e0200/artifacts/n8l5t7yt_Datasets%20-%20users.csv.csv",
+    "transactions": "https://customer-assets.emergentagent.com/job_5edf4d13-8af0-4ee5-a665-c1ddf41e0200/artifacts/a8soib4o_Datasets%20-%20transactions.csv.csv",
+}
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '5000'))
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '1000'))
+
+def prepare_books(books_df):
+    if 'shelf_location' not in books_df.columns:
+        books_df['shelf_location'] = 'A1'
+    return books_df
+
+def prepare_users(users_df):
+    import numpy as np
+    
+    departments = ['Computer Science', 'Electronics', 'Mechanical', 'Civil', 'MBA', 'Arts']
+    semesters = ['1', '2', '3', '4', '5', '6', '7', '8']
+    if 'department' not in users_df.columns:
+        users_df['department'] = np.random.choice(departments, len(users_df))
+    if 'semester' not in users_df.columns:
+        users_df['semester'] = np.random.choice(semesters, len(users_df))
+    # Convert phone and semester to strings
+    users_df['phone'] = users_df['phone'].astype(str)
+    users_df['semester'] = users_df['semester'].astype(str)
+    return users_df
+
+def prepare_transactions(trans_df, policy: Optional[dict] = None):
+    import numpy as np
+    import pandas as pd
+    
+    # Parse the CSV's ISO strings once into UTC datetimes, stored as BSON dates
+    dates = {field: to_naive_datetime64(trans_df[field]) for field in DATE_FIELDS}
+    is_open = np.isnat(dates['return_date'])
+    trans_df['status'] = np.where(is_open, 'issued', 'returned')
+    policy = policy or FINE_CONFIG
+    fines = calculate_fines_batch(
+        dates['due_date'],
+        dates['return_date'],
+        policy['grace_period_days'],
+        tiers=policy['tiers']
+    )
+    # Open loans accrue until returned; fine_amount is what a return charged
+    accrual = accrual_fields(dates['due_date'], utc_now(), policy)
+    trans_df['fine_amount'] = np.where(is_open, 0.0, fines)
+    trans_df['accrued_fine'] = np.where(is_open, fines, 0.0)
+    with np.errstate(invalid='ignore'):
+        # Rows missing either date come out as 0
+        days_late = (dates['return_date'] - dates['due_date']) // np.timedelta64(1, 'D')
+    trans_df['overdue_days'] = np.where(is_open, accrual['overdue_days'], np.maximum(days_late, 0))
+    dates['next_accrual_at'] = np.where(is_open, accrual['next_accrual_at'], np.datetime64('NaT'))
+    trans_df = trans_df.replace({np.nan: None})
+    for field, values in dates.items():
+        # object dtype keeps python datetimes (and None for NaT) through to_dict
+        trans_df[field] = pd.Series(values.astype(object), index=trans_df.index, dtype=object)
+    return trans_df
+
+IMPORT_PLAN = [
+    ("books", "book_id", prepare_books),
+    ("users", "user_id", prepare_users),
+    ("transactions", "transaction_id", prepare_transactions),
+]
+
+async def download_to_tempfile(url: str) -> str:
+    """Stream a URL to a temporary file without holding the body in memory"""
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'wb') as out:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=None) as client_http:
+            async with client_http.stream('GET', url) as response:
+                response.raise_for_status()
+                async for block in response.aiter_bytes():
+                    out.write(block)
+    return path
+
+async def import_collection(collection: str, source: str, key: str, prepare,
+                            chunk_size: int = IMPORT_CHUNK_SIZE, force: bool = False,
+                            progress=None) -> int:
+    """Load one CSV into `collection`, resuming from its checkpoint. Returns rows written."""
+    checkpoint = await db.import_checkpoints.find_one({"_id": collection})
+    if checkpoint and checkpoint["source"] == source and not force:
+        if checkpoint["completed"]:
+            return 0
+        skip = checkpoint["rows_done"]
+    elif not force and await db[collection].count_documents({}, limit=1):
+        # Loaded before checkpoints existed (or by hand); leave it alone
+        return 0
+    else:
+        skip = 0
+    
+    import pandas as pd
+    
+    path = source
+    if source.startswith(('http://', 'https://')):
+        path = await download_to_tempfile(source)
+    
+    rows_done = skip
+    try:
+        with pd.read_csv(
+            path,
+            chunksize=chunk_size,
+            skiprows=(lambda i: 0 < i <= skip) if skip else None
+        ) as reader:
+            while True:
+                chunk = await jobs.run_in_pool(next, reader, None)
+                if chunk is None:
+                    break
+                docs = await jobs.run_in_pool(lambda: prepare(chunk).to_dict('records'))
+                for start in range(0, len(docs), IMPORT_BATCH_SIZE):
+                    await db[collection].bulk_write([
+                        UpdateOne({key: doc[key]}, {"$setOnInsert": doc}, upsert=True)
+                        for doc in docs[start:start + IMPORT_BATCH_SIZE]
+                    ], ordered=False)
+                rows_done += len(docs)
+                await db.import_checkpoints.update_one(
+                    {"_id": collection},
+                    {"$set": {
+                        "source": source,
+                        "rows_done": rows_done,
+                        "completed": False,
+                        "updated_at": datetime.now(timezone.utc).isoformat()
+                    }},
+                    upsert=True
                 )
-                trans_df = trans_df.replace({np.nan: None})
-                trans_data = trans_df.to_dict('records')
-                if trans_data:
-                    await db.transactions.insert_many(trans_data)
-                    logger.info(f"Imported {len(trans_data)} transactions")
+                if progress:
+                    await progress(collection, rows_done)
+    finally:
+        if path != source:
+            os.unlink(path)
     
-    except Exception as e:
-        logger.error(f"Error importing data: {e}")
+    await db.import_checkpoints.update_one({"_id": collection}, {"$set": {"completed": True}})
+    logger.info(f"Imported {rows_done - skip} {collection}")
+    return rows_done - skip
+
+async def import_initial_data(sources: Optional[dict] = None, chunk_size: int = IMPORT_CHUNK_SIZE,
+                              force: bool = False, progress=None) -> dict:
+    """Import books, users and transactions from CSV URLs or local paths into MongoDB"""
+    sources = {**DATA_SOURCES, **(sources or {})}
+    policy = await current_fine_policy()
+    imported = {}
+    for collection, key, prepare in IMPORT_PLAN:
+        if prepare is prepare_transactions:
+            prepare = functools.partial(prepare_transactions, policy=policy)
+        imported[collection] = await import_collection(
+            collection, sources[collection], key, prepare, chunk_size, force, progress
+        )
+    
+    if any(imported.values()):
+        await rebuild_dashboard_stats()
+        cache.clear()
+    return imported
+
+async def start_import_job(**options) -> Optional[dict]:
+    """Run the import in the background on exactly one worker.
+
+    The worker that takes the import lease runs the job and keeps renewing the
+    lease until it finishes; if it dies the lease expires and the next caller
+    resumes from the checkpoints. Other callers, on this worker or another,
+    get the in-flight job, if it has been recorded yet, or None.
+    """
+    if running_import["job_id"]:
+        return await jobs.get_job(db, running_import["job_id"])
+    # Taken, never renewed here: the worker already importing must not start a second job
+    if not await jobs.take_lease(db, IMPORT_LEASE, WORKER_ID, IMPORT_LEASE_TTL):
+        return await db.jobs.find_one(
+            {"kind": "import", "status": {"$in": ["pending", "running"]}},
+            sort=[("created_at", -1)]
+        )
+    
+    async def work(job_id):
+        async def progress(collection, rows_done):
+            await jobs.update_progress(db, job_id, **{collection: rows_done})
+        keepalive = asyncio.create_task(jobs.keep_lease(db, IMPORT_LEASE, WORKER_ID, IMPORT_LEASE_TTL))
+        try:
+            return {"imported": await import_initial_data(progress=progress, **options)}
+        finally:
+            keepalive.cancel()
+            running_import["job_id"] = None
+            await jobs.release_lease(db, IMPORT_LEASE, WORKER_ID)
+    
+    try:
+        job = await jobs.start_job(db, "import", work, params=options)
+    except Exception:
+        await jobs.release_lease(db, IMPORT_LEASE, WORKER_ID)
+        raise
+    running_import["job_id"] = job["_id"]
+    return job
+
+async def prepare_database(import_started: bool = False) -> bool:
+    """Create the indexes and, unless `import_started`, start the import.
+
+    Returns whether the import has been started. A missing index (e.g.
+    duplicates blocking a unique one) keeps this worker unready.
+    """
+    readiness["indexes"] = not await ensure_indexes()
+    if not import_started:
+        try:
+            await start_import_job()
+            import_started = True
+        except PyMongoError as e:
+            logger.error(f"Could not start the data import: {e}")
+    return import_started
+
+async def run_database_setup():
+    """Retry database setup every SETUP_RETRY_SECONDS until it succeeds, e.g.
+    once MongoDB is reachable again"""
+    import_started = False
+    while True:
+        try:
+            import_started = await prepare_database(import_started)
+        except Exception:
+            logger.exception("Database setup failed")
+        if (readiness["indexes"] and import_started) or SETUP_RETRY_SECONDS <= 0:
+            return
+        await asyncio.sleep(SETUP_RETRY_SECONDS)
+
+# Date Migration
+# Transactions written before dates were stored natively hold ISO strings.
+# The migration rewrites them in batches while the app keeps serving.
+async def migrate_transaction_dates(batch_size: int = IMPORT_BATCH_SIZE, progress=None) -> int:
+    """Convert string issue/due/return dates on transactions to UTC datetimes.
+
+    Each update is conditional on the string values it read, so a loan that
+    changes mid-migration is never overwritten with stale data. Safe to re-run;
+    returns the number of transactions converted.
+    """
+    has_string_date = {"$or": [{field: {"$type": "string"}} for field in DATE_FIELDS]}
+    projection = {field: 1 for field in DATE_FIELDS}
+    converted = 0
+    last_id = None
+    while True:
+        query = has_string_date if last_id is None else {**has_string_date, "_id": {"$gt": last_id}}
+        batch = await db.transactions.find(query, projection).sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        
+        updates = []
+        for doc in batch:
+            strings = {field: doc[field] for field in DATE_FIELDS if isinstance(doc.get(field), str)}
+            updates.append(UpdateOne(
+                {"_id": doc["_id"], **strings},
+                {"$set": {field: to_utc(value) for field, value in strings.items()}}
+            ))
+        result = await db.transactions.bulk_write(updates, ordered=False)
+        converted += result.modified_count
+        if progress:
+            await progress(converted)
+    
+    if converted:
+        cache.invalidate(prefix="analytics:")
+    logger.info(f"Migrated dates on {converted} transactions")
+    return converted
 
 # API Endpoints
 @api_router.get("/")
 async def root():
     return {"message": "Digital Library Access Tracker API"}
 
-@api_router.post("/init-data")
+@api_router.post("/init-data", status_code=202)
 async def initialize_data():
-    await import_initial_data()
-    return {"message": "Data import initiated"}
+    job = await start_import_job()
+    if not job:
+        return {"message": "Data import already running on another worker", "job_id": None}
+    return {"message": "Data import initiated", **jobs.public_job(job)}
+
+@api_router.get("/init-data/{job_id}")
+async def get_import_job(job_id: str):
+    job = await jobs.get_job(db, job_id)
+    if not job or job["kind"] != "import":
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return jobs.public_job(job)
 
 # Books
 @api_router.get("/books", response_model=List[Book])
-async def get_books(genre: Optional[str] = None, search: Optional[str] = None):
+async def get_books(response: Response, genre: Optional[str] = None, search: Optional[str] = None,
+                    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                    after: Optional[str] = None, stream: bool = False):
     query = {}
     if genre:
         query["genre"] = genre
     if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"author": {"$regex": search, "$options": "i"}}
-        ]
-    books = await db.books.find(query, {"_id": 0}).to_list(1000)
-    return books
+        # Word search over title and author via the books_search text index
+        query["$text"] = {"$search": search}
+    return fast_response(await paginate(db.books, query, "book_id", response, limit, after, stream), response, Book)
 
 @api_router.post("/books", response_model=Book)
 async def create_book(book: BookCreate):
-    existing = await db.books.find_one({"book_id": book.book_id})
-    if existing:
-        raise HTTPException(status_code=400, detail="Book ID already exists")
-    
     book_dict = book.model_dump()
-    await db.books.insert_one(book_dict)
+    try:
+        await db.books.insert_one(book_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Book ID already exists")
+    await bump_dashboard_stats(total_books=1)
+    cache.invalidate("books:genres", f"book:{book.book_id}", prefix="analytics:")
+    bus.publish("book_created", book_id=book.book_id)
     return book
 
 @api_router.put("/books/{book_id}")
 async def update_book(book_id: str, book: BookCreate):
-    result = await db.books.update_one(
-        {"book_id": book_id},
-        {"$set": book.model_dump()}
-    )
+    try:
+        result = await db.books.update_one(
+            {"book_id": book_id},
+            {"$set": book.model_dump()}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Book ID already exists")
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Book not found")
+    cache.invalidate("books:genres", f"book:{book_id}", f"book:{book.book_id}", prefix="analytics:")
     return {"message": "Book updated successfully"}
 
 @api_router.get("/books/genres")
 async def get_genres():
-    genres = await db.books.distinct("genre")
-    return {"genres": sorted(genres)}
+    async def load():
+        return {"genres": sorted(await db.books.distinct("genre"))}
+    return await cache.get_or_load("books:genres", load)
 
 # Users
 @api_router.get("/users", response_model=List[User])
-async def get_users(department: Optional[str] = None, search: Optional[str] = None):
+async def get_users(response: Response, department: Optional[str] = None, search: Optional[str] = None,
+                    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                    after: Optional[str] = None, stream: bool = False):
     query = {}
     if department:
         query["department"] = department
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}}
-        ]
-    users = await db.users.find(query, {"_id": 0}).to_list(1000)
-    return users
+        # Word search over name and email via the users_search text index
+        query["$text"] = {"$search": search}
+    return fast_response(await paginate(db.users, query, "user_id", response, limit, after, stream), response, User)
 
 @api_router.post("/users", response_model=User)
 async def create_user(user: UserCreate):
-    existing = await db.users.find_one({"user_id": user.user_id})
-    if existing:
-        raise HTTPException(status_code=400, detail="User ID already exists")
-    
     user_dict = user.model_dump()
-    await db.users.insert_one(user_dict)
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User ID already exists")
+    await bump_dashboard_stats(total_users=1)
+    cache.invalidate("users:departments", f"user:{user.user_id}")
+    bus.publish("user_created", user_id=user.user_id)
     return user
 
 @api_router.get("/users/departments")
 async def get_departments():
-    departments = await db.users.distinct("department")
-    return {"departments": sorted(departments) if departments else []}
+    async def load():
+        departments = await db.users.distinct("department")
+        return {"departments": sorted(departments) if departments else []}
+    return await cache.get_or_load("users:departments", load)
 
 # Transactions
 @api_router.get("/transactions", response_model=List[Transaction])
-async def get_transactions(status: Optional[str] = None, user_id: Optional[str] = None):
+async def get_transactions(response: Response, status: Optional[str] = None, user_id: Optional[str] = None,
+                           date_from: Optional[datetime] = Query(None, alias="from"),
+                           date_to: Optional[datetime] = Query(None, alias="to"),
+                           limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                           after: Optional[str] = None, stream: bool = False,
+                           include_archive: bool = False):
     query = {}
     if status:
         query["status"] = status
     if user_id:
         query["user_id"] = user_id
-    transactions = await db.transactions.find(query, {"_id": 0}).to_list(1000)
-    return transactions
+    keys = ["transaction_id"]
+    if date_from or date_to:
+        # Issued in [from, to): a range scan on the (issue_date, transaction_id) index
+        keys = ["issue_date", "transaction_id"]
+        query["issue_date"] = {}
+        if date_from:
+            query["issue_date"]["$gte"] = to_utc(date_from)
+        if date_to:
+            query["issue_date"]["$lt"] = to_utc(date_to)
+    
+    if include_archive and status != "issued":
+        if stream:
+            raise HTTPException(status_code=400, detail="stream is not supported with include_archive")
+        rows = await paginate_with_archive(query, keys, response, limit, after)
+    else:
+        rows = await paginate(db.transactions, query, keys, response, limit, after, stream)
+    return fast_response(rows, response, Transaction)
 
 @api_router.post("/transactions/issue")
 async def issue_book(transaction: TransactionCreate):
-    book = await db.books.find_one({"book_id": transaction.book_id})
+    # Reserve a copy with a conditional decrement so concurrent issues can't
+    # oversell; the user lookup runs in the same round-trip.
+    book, user = await asyncio.gather(
+        db.books.find_one_and_update(
+            {"book_id": transaction.book_id, "available_copies": {"$gt": 0}},
+            {"$inc": {"available_copies": -1}},
+            projection={"_id": 1}
+        ),
+        get_cached_user(transaction.user_id)
+    )
     if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    
-    if book["available_copies"] <= 0:
+        if not await get_cached_book(transaction.book_id):
+            raise HTTPException(status_code=404, detail="Book not found")
         raise HTTPException(status_code=400, detail="Book not available")
     
-    user = await db.users.find_one({"user_id": transaction.user_id})
     if not user:
+        await db.books.update_one({"_id": book["_id"]}, {"$inc": {"available_copies": 1}})
         raise HTTPException(status_code=404, detail="User not found")
     
-    issue_date = datetime.now(timezone.utc)
+    issue_date = utc_now()
     due_date = issue_date + timedelta(days=transaction.borrow_days)
     
-    trans_id = f"T{int(datetime.now().timestamp())}"
+    trans_id = new_transaction_id()
     
     new_transaction = {
         "transaction_id": trans_id,
         "book_id": transaction.book_id,
         "user_id": transaction.user_id,
-        "issue_date": issue_date.isoformat(),
+        "issue_date": issue_date,
         "return_date": None,
-        "due_date": due_date.isoformat(),
+        "due_date": due_date,
         "status": "issued",
-        "fine_amount": 0.0
+        "fine_amount": 0.0,
+        "accrued_fine": 0.0,
+        "overdue_days": 0,
+        "next_accrual_at": due_date + timedelta(days=1)
     }
     
-    await db.transactions.insert_one(new_transaction)
-    await db.books.update_one(
-        {"book_id": transaction.book_id},
-        {"$inc": {"available_copies": -1}}
-    )
+    try:
+        await db.transactions.insert_one(new_transaction)
+    except Exception:
+        await db.books.update_one({"_id": book["_id"]}, {"$inc": {"available_copies": 1}})
+        raise
+    await bump_dashboard_stats(total_transactions=1, active_loans=1)
+    cache.invalidate(f"book:{transaction.book_id}", prefix="analytics:")
+    bus.publish("loans_issued", count=1)
     
     return {"message": "Book issued successfully", "transaction_id": trans_id}
 
 @api_router.post("/transactions/return")
 async def return_book(return_data: TransactionReturn):
-    transaction = await db.transactions.find_one({"transaction_id": return_data.transaction_id})
+    transaction = await db.transactions.find_one(
+        {"transaction_id": return_data.transaction_id},
+        {"_id": 0, "book_id": 1, "status": 1, "issue_date": 1, "due_date": 1}
+    )
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
     if transaction["status"] == "returned":
         raise HTTPException(status_code=400, detail="Book already returned")
     
-    return_date = datetime.now(timezone.utc)
+    return_date = utc_now()
+    policy = await current_fine_policy()
     fine = calculate_fine(
         transaction["due_date"],
-        return_date.isoformat(),
-        FINE_CONFIG["grace_period_days"]
+        return_date,
+        policy["grace_period_days"],
+        policy["tiers"]
     )
     
-    await db.transactions.update_one(
-        {"transaction_id": return_data.transaction_id},
+    # Only an issued loan may transition to returned; a concurrent return of
+    # the same transaction matches nothing here. The pre-image carries the
+    # accrued fine this return moves from accrued to collected.
+    returned = await db.transactions.find_one_and_update(
+        {"transaction_id": return_data.transaction_id, "status": "issued"},
         {"$set": {
-            "return_date": return_date.isoformat(),
+            "return_date": return_date,
             "status": "returned",
-            "fine_amount": fine
-        }}
+            "fine_amount": fine,
+            "accrued_fine": 0.0,
+            "overdue_days": max((return_date - to_utc(transaction["due_date"])).days, 0),
+            "next_accrual_at": None
+        }},
+        projection={"_id": 0, "transaction_id": 1, "accrued_fine": 1}
     )
+    if returned is None:
+        raise HTTPException(status_code=400, detail="Book already returned")
     
     await db.books.update_one(
         {"book_id": transaction["book_id"]},
         {"$inc": {"available_copies": 1}}
     )
+    await bump_dashboard_stats(
+        active_loans=-1,
+        returned_loans=1,
+        total_fines=fine,
+        accrued_fines=-returned.get("accrued_fine", 0.0),
+        total_borrow_days=borrow_duration_days(transaction["issue_date"], return_date)
+    )
+    cache.invalidate(f"book:{transaction['book_id']}", prefix="analytics:")
+    bus.publish("loans_returned", count=1)
     
     return {"message": "Book returned successfully", "fine_amount": fine}
 
-# Analytics
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats():
-    transactions = await db.transactions.find({}, {"_id": 0}).to_list(10000)
-    books = await db.books.find({}, {"_id": 0}).to_list(1000)
-    users = await db.users.find({}, {"_id": 0}).to_list(1000)
+@api_router.post("/transactions/issue/bulk")
+async def issue_books_bulk(request: BulkIssueRequest):
+    """Issue many books at once; each item succeeds or fails on its own"""
+    items = request.items
+    book_ids = list({item.book_id for item in items})
+    user_ids = list({item.user_id for item in items})
+    books, users = await asyncio.gather(
+        db.books.find({"book_id": {"$in": book_ids}}, {"_id": 0, "book_id": 1, "available_copies": 1}).to_list(None),
+        db.users.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1}).to_list(None)
+    )
+    available = {book["book_id"]: book["available_copies"] for book in books}
+    known_users = {user["user_id"] for user in users}
     
-    trans_df = pd.DataFrame(transactions)
+    results = [None] * len(items)
+    wanted = {}
+    for i, item in enumerate(items):
+        if item.book_id not in available:
+            results[i] = {"status": "error", "detail": "Book not found"}
+        elif item.user_id not in known_users:
+            results[i] = {"status": "error", "detail": "User not found"}
+        elif wanted.get(item.book_id, 0) >= available[item.book_id]:
+            results[i] = {"status": "error", "detail": "Book not available"}
+        else:
+            wanted.setdefault(item.book_id, 0)
+            wanted[item.book_id] += 1
     
-    total_books = len(books)
-    total_users = len(users)
-    total_transactions = len(transactions)
+    # Reserve all copies of a book with one conditional $inc; if another
+    # request got there first, that book's items fail rather than oversell.
+    reservations = await asyncio.gather(*[
+        db.books.find_one_and_update(
+            {"book_id": book_id, "available_copies": {"$gte": count}},
+            {"$inc": {"available_copies": -count}},
+            projection={"_id": 1}
+        )
+        for book_id, count in wanted.items()
+    ])
+    reserved = {book_id for book_id, book in zip(wanted, reservations) if book}
     
-    issued_count = len(trans_df[trans_df['status'] == 'issued']) if not trans_df.empty else 0
+    issue_date = utc_now()
+    inserts = []
+    # Item index of each insert
+    inserted_items = []
+    for i, item in enumerate(items):
+        if results[i]:
+            continue
+        if item.book_id not in reserved:
+            results[i] = {"status": "error", "detail": "Book not available"}
+            continue
+        trans_id = new_transaction_id()
+        due_date = issue_date + timedelta(days=item.borrow_days)
+        inserts.append(InsertOne({
+            "transaction_id": trans_id,
+            "book_id": item.book_id,
+            "user_id": item.user_id,
+            "issue_date": issue_date,
+            "return_date": None,
+            "due_date": due_date,
+            "status": "issued",
+            "fine_amount": 0.0,
+            "accrued_fine": 0.0,
+            "overdue_days": 0,
+            "next_accrual_at": due_date + timedelta(days=1)
+        }))
+        results[i] = {"status": "issued", "transaction_id": trans_id}
+        inserted_items.append(i)
     
-    now = datetime.now(timezone.utc).replace(tzinfo=None)
-    overdue_count = 0
-    total_fines = 0.0
-    
-    if not trans_df.empty:
-        for _, row in trans_df.iterrows():
-            if row['status'] == 'issued':
-                due_date = datetime.fromisoformat(row['due_date']).replace(tzinfo=None)
-                if now > due_date:
-                    overdue_count += 1
-            total_fines += float(row.get('fine_amount', 0))
-    
-    avg_borrow_duration = 0
-    if not trans_df.empty and 'issue_date' in trans_df.columns:
-        trans_df['issue_date'] = pd.to_datetime(trans_df['issue_date'])
-        trans_df['return_date'] = pd.to_datetime(trans_df['return_date'], errors='coerce')
-        returned = trans_df[trans_df['status'] == 'returned'].copy()
-        if not returned.empty:
-            returned['duration'] = (returned['return_date'] - returned['issue_date']).dt.days
-            avg_borrow_duration = float(returned['duration'].mean())
+    issued = 0
+    if inserts:
+        try:
+            await db.transactions.bulk_write(inserts, ordered=False)
+            failed = []
+        except BulkWriteError as e:
+            failed = [inserted_items[error["index"]] for error in e.details["writeErrors"]]
+        # Loans that were not recorded give their reserved copies back
+        released = {}
+        for i in failed:
+            results[i] = {"status": "error", "detail": "Could not record the loan"}
+            released[items[i].book_id] = released.get(items[i].book_id, 0) + 1
+        for book_id, count in released.items():
+            await db.books.update_one({"book_id": book_id}, {"$inc": {"available_copies": count}})
+        
+        issued = len(inserts) - len(failed)
+        if issued:
+            await bump_dashboard_stats(total_transactions=issued, active_loans=issued)
+            bus.publish("loans_issued", count=issued)
+        cache.invalidate(*[f"book:{book_id}" for book_id in reserved], prefix="analytics:")
     
     return {
-        "total_books": total_books,
-        "total_users": total_users,
-        "total_transactions": total_transactions,
-        "active_loans": issued_count,
-        "overdue_books": overdue_count,
-        "total_fines": round(total_fines, 2),
-        "avg_borrow_duration": round(avg_borrow_duration, 1)
+        "issued": issued,
+        "failed": len(items) - issued,
+        "results": [
+            {"book_id": item.book_id, "user_id": item.user_id, **result}
+            for item, result in zip(items, results)
+        ]
     }
 
-@api_router.get("/analytics/top-borrowers")
-async def get_top_borrowers(limit: int = 10):
-    transactions = await db.transactions.find({}, {"_id": 0}).to_list(10000)
-    users = await db.users.find({}, {"_id": 0}).to_list(1000)
+@api_router.post("/transactions/return/bulk")
+async def return_books_bulk(request: BulkReturnRequest):
+    """Return many loans at once; each item succeeds or fails on its own"""
+    items = request.items
+    transaction_ids = [item.transaction_id for item in items]
+    transactions = await db.transactions.find(
+        {"transaction_id": {"$in": transaction_ids}},
+        {"_id": 0, "transaction_id": 1, "book_id": 1, "status": 1, "issue_date": 1, "due_date": 1, "accrued_fine": 1}
+    ).to_list(None)
+    by_id = {trans["transaction_id"]: trans for trans in transactions}
     
-    trans_df = pd.DataFrame(transactions)
-    users_df = pd.DataFrame(users)
+    results = [None] * len(items)
+    to_return = []
+    seen = set()
+    for i, item in enumerate(items):
+        trans = by_id.get(item.transaction_id)
+        if not trans:
+            results[i] = {"status": "error", "detail": "Transaction not found"}
+        elif trans["status"] == "returned" or item.transaction_id in seen:
+            results[i] = {"status": "error", "detail": "Book already returned"}
+        else:
+            to_return.append(i)
+        seen.add(item.transaction_id)
+    
+    if to_return:
+        return_date = utc_now()
+        policy = await current_fine_policy()
+        loans = [by_id[transaction_ids[i]] for i in to_return]
+        fines = calculate_fines_batch(
+            [loan["due_date"] for loan in loans],
+            [return_date] * len(loans),
+            policy["grace_period_days"],
+            tiers=policy["tiers"]
+        )
+        result = await db.transactions.bulk_write([
+            UpdateOne(
+                {"transaction_id": loan["transaction_id"], "status": "issued"},
+                {"$set": {
+                    "return_date": return_date,
+                    "status": "returned",
+                    "fine_amount": float(fine),
+                    "accrued_fine": 0.0,
+                    "overdue_days": max((return_date - to_utc(loan["due_date"])).days, 0),
+                    "next_accrual_at": None
+                }}
+            )
+            for loan, fine in zip(loans, fines)
+        ], ordered=False)
+        
+        # Loans returned concurrently by someone else were not modified; the
+        # ones we returned carry this batch's exact return timestamp.
+        applied = set(by_id) if result.modified_count == len(loans) else {
+            trans["transaction_id"] for trans in await db.transactions.find(
+                {"transaction_id": {"$in": transaction_ids}, "return_date": return_date},
+                {"_id": 0, "transaction_id": 1}
+            ).to_list(None)
+        }
+        
+        copies = {}
+        total_fines = 0.0
+        # Read before the update, so a sweep in between can leave the running
+        # total slightly off; the next sweep recomputes it
+        accrued_fines = 0.0
+        total_borrow_days = 0
+        for i, loan, fine in zip(to_return, loans, fines):
+            if loan["transaction_id"] not in applied:
+                results[i] = {"status": "error", "detail": "Book already returned"}
+                continue
+            copies[loan["book_id"]] = copies.get(loan["book_id"], 0) + 1
+            total_fines += float(fine)
+            accrued_fines += float(loan.get("accrued_fine") or 0)
+            total_borrow_days += borrow_duration_days(loan["issue_date"], return_date)
+            results[i] = {"status": "returned", "fine_amount": float(fine)}
+        
+        if copies:
+            await db.books.bulk_write([
+                UpdateOne({"book_id": book_id}, {"$inc": {"available_copies": count}})
+                for book_id, count in copies.items()
+            ], ordered=False)
+            returned = sum(copies.values())
+            await bump_dashboard_stats(
+                active_loans=-returned,
+                returned_loans=returned,
+                total_fines=total_fines,
+                accrued_fines=-accrued_fines,
+                total_borrow_days=total_borrow_days
+            )
+            cache.invalidate(*[f"book:{book_id}" for book_id in copies], prefix="analytics:")
+            bus.publish("loans_returned", count=returned)
     
-    if trans_df.empty:
-        return []
+    returned = sum(1 for result in results if result["status"] == "returned")
+    return {
+        "returned": returned,
+        "failed": len(items) - returned,
+        "results": [
+            {"transaction_id": item.transaction_id, **result}
+            for item, result in zip(items, results)
+        ]
+    }
+
+# Analytics
+async def compute_dashboard_stats():
+    stats = await db.dashboard_stats.find_one({"_id": DASHBOARD_STATS_ID})
+    if not stats:
+        stats = await rebuild_dashboard_stats()
     
-    borrower_stats = trans_df.groupby('user_id').agg({
-        'transaction_id': 'count',
-        'fine_amount': 'sum'
-    }).reset_index()
+    # Overdue status depends on the clock, so it is counted rather than stored
+    overdue_count = await db.transactions.count_documents({
+        "status": "issued",
+        "due_date": {"$lt": utc_now()}
+    })
     
-    borrower_stats.columns = ['user_id', 'loan_count', 'total_fines']
-    borrower_stats = borrower_stats.merge(users_df[['user_id', 'name', 'email', 'department']], on='user_id', how='left')
-    borrower_stats = borrower_stats.sort_values('loan_count', ascending=False).head(limit)
+    returned_loans = stats.get("returned_loans", 0)
+    avg_borrow_duration = stats.get("total_borrow_days", 0) / returned_loans if returned_loans else 0
     
-    return borrower_stats.to_dict('records')
+    return {
+        "total_books": stats.get("total_books", 0),
+        "total_users": stats.get("total_users", 0),
+        "total_transactions": stats.get("total_transactions", 0),
+        "active_loans": stats.get("active_loans", 0),
+        "overdue_books": overdue_count,
+        # Collected on returns plus accrued so far on open loans
+        "total_fines": round(stats.get("total_fines", 0.0) + stats.get("accrued_fines", 0.0), 2),
+        "avg_borrow_duration": round(avg_borrow_duration, 1)
+    }
+
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats():
+    # Not cached (counters change on every write), but concurrent opens share one read
+    return await flights.do("dashboard:stats", compute_dashboard_stats)
+
+@api_router.post("/dashboard/stats/rebuild")
+async def rebuild_dashboard_stats_endpoint():
+    stats = await rebuild_dashboard_stats()
+    stats.pop("_id", None)
+    return {"message": "Dashboard stats rebuilt", "stats": stats}
+
+async def pipeline_input_size(archived: bool) -> int:
+    """Documents read by an analytics pipeline, which groups every loan (and rollup)"""
+    size = await db.transactions.estimated_document_count()
+    if archived:
+        size += await db.transaction_rollups.estimated_document_count()
+    return size
+
+async def analytics_rows(endpoint: str, key: str, from_snapshot_loader, pipeline):
+    """(rows, snapshot refresh time) from the snapshot if there is one, else
+    (rows, None) from a live aggregation; a None `from_snapshot_loader` always
+    aggregates live"""
+    async def load():
+        result = await from_snapshot_loader() if from_snapshot_loader else None
+        if result is not None:
+            return result
+        archived = await has_archive()
+        rows = await db.transactions.aggregate(with_archive(pipeline, archived), allowDiskUse=True).to_list(None)
+        ANALYTICS_SCANNED.inc(await pipeline_input_size(archived), endpoint=endpoint, source="mongo")
+        ANALYTICS_RETURNED.inc(len(rows), endpoint=endpoint, source="mongo")
+        return rows, None
+    return await load_shared(key, load)
+
+async def snapshot_or_pipeline(response: Response, endpoint: str, key: str, from_snapshot_loader, pipeline):
+    rows, refreshed_at = await analytics_rows(endpoint, key, from_snapshot_loader, pipeline)
+    if refreshed_at:
+        response.headers["X-Snapshot-At"] = refreshed_at
+    return fast_response(rows, response)
+
+@api_router.get("/analytics/top-borrowers")
+async def get_top_borrowers(response: Response, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE)):
+    return await snapshot_or_pipeline(
+        response, "top-borrowers", f"analytics:top-borrowers:{limit}",
+        lambda: top_borrowers_from_snapshot(limit), top_borrowers_pipeline(limit)
+    )
 
 @api_router.get("/analytics/top-books")
-async def get_top_books(limit: int = 10):
-    transactions = await db.transactions.find({}, {"_id": 0}).to_list(10000)
-    books = await db.books.find({}, {"_id": 0}).to_list(1000)
+async def get_top_books(response: Response, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE)):
+    return await snapshot_or_pipeline(
+        response, "top-books", f"analytics:top-books:{limit}",
+        lambda: top_books_from_snapshot(limit), top_books_pipeline(limit)
+    )
+
+@api_router.get("/analytics/genre-distribution")
+async def get_genre_distribution(response: Response):
+    return await snapshot_or_pipeline(
+        response, "genre-distribution", "analytics:genre-distribution",
+        genre_distribution_from_snapshot, genre_distribution_pipeline()
+    )
+
+async def fetch_overdue_page(limit: Optional[int] = None, cursor: Optional[str] = None):
+    """One page of overdue loans, most overdue first, plus the cursor for the next page.
+
+    Served from the (status, due_date) index: sorting by due date ascending is
+    the same as sorting by overdue days descending. Book and user details are
+    joined server-side for the rows on the page only; fines and overdue days
+    are the values maintained by the accrual sweep.
+    """
+    now = utc_now()
+    query = {"status": "issued", "due_date": {"$lt": now}}
+    if cursor:
+        query.update(after_key(["due_date", "transaction_id"], decode_cursor(cursor, 2)))
     
-    trans_df = pd.DataFrame(transactions)
-    books_df = pd.DataFrame(books)
+    pipeline = [
+        {"$match": query},
+        {"$sort": {"due_date": 1, "transaction_id": 1}},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline += [
+        {"$lookup": {"from": "books", "localField": "book_id", "foreignField": "book_id", "as": "book"}},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "user_id", "as": "user"}},
+        {"$project": {
+            "_id": 0, "transaction_id": 1, "user_id": 1, "book_id": 1, "issue_date": 1, "due_date": 1,
+            "overdue_days": 1, "accrued_fine": 1, "book.title": 1, "user.name": 1, "user.email": 1
+        }}
+    ]
+    rows = await db.transactions.aggregate(pipeline).to_list(None)
+    if not rows:
+        return [], None
     
-    if trans_df.empty:
-        return []
+    overdue_list = []
+    for row in rows:
+        book = row['book'][0] if row['book'] else {}
+        user = row['user'][0] if row['user'] else {}
+        overdue_list.append({
+            'transaction_id': row['transaction_id'],
+            'user_id': row['user_id'],
+            'user_name': user.get('name', 'N/A'),
+            'user_email': user.get('email', 'N/A'),
+            'book_id': row['book_id'],
+            'book_title': book.get('title', 'N/A'),
+            'issue_date': iso_utc(row['issue_date']),
+            'due_date': iso_utc(row['due_date']),
+            'overdue_days': row.get('overdue_days', 0),
+            'fine_amount': row.get('accrued_fine', 0.0)
+        })
+    
+    next_cursor = None
+    if limit and len(rows) == limit:
+        next_cursor = encode_cursor([rows[-1]['due_date'], rows[-1]['transaction_id']])
+    return overdue_list, next_cursor
+
+@api_router.get("/analytics/overdue-list")
+async def get_overdue_list(response: Response, limit: Optional[int] = Query(None, ge=1, le=1000),
+                           cursor: Optional[str] = None):
+    overdue_list, next_cursor = await load_shared(
+        f"analytics:overdue-list:{limit}:{cursor}", lambda: fetch_overdue_page(limit, cursor)
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return fast_response(overdue_list, response)
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    return {**cache.stats(), "single_flight": flights.stats()}
+
+# Fines
+@api_router.get("/fines/policy", response_model=FinePolicy)
+async def get_fine_policy():
+    return await current_fine_policy()
+
+@api_router.get("/fines/policies", response_model=List[FinePolicy])
+async def get_fine_policies():
+    """Every saved policy version, newest first"""
+    return await db.fine_policies.find({}, {"_id": 0}).sort("_id", -1).to_list(None)
+
+@api_router.post("/fines/policy", response_model=FinePolicy)
+async def create_fine_policy(policy: FinePolicyCreate):
+    return await save_fine_policy(policy)
+
+@api_router.post("/fines/simulate")
+async def simulate_fines(request: FineSimulationRequest, response: Response):
+    """Re-price every loan under the current policy and each candidate.
+
+    The current policy comes first in the results; `change` is each policy's
+    total minus the current one's. Reads the analytics snapshot when there is
+    one (its refresh time is in X-Snapshot-At), else MongoDB.
+    """
+    current = FinePolicy.model_validate(await current_fine_policy()).model_dump(mode="json")
+    policies = [current] + [policy.model_dump() for policy in request.policies]
+    simulation = FineSimulation(policies, request.as_of or utc_now())
+    result = await from_snapshot(lambda table: simulate_fines_over_table(table, simulation))
+    if result is not None:
+        response.headers["X-Snapshot-At"] = result[1]
+        source = "snapshot"
+    else:
+        await simulate_fines_over_mongo(simulation)
+        source = "mongo"
+    ANALYTICS_SCANNED.inc(simulation.loans, endpoint="fine-simulation", source=source)
+    return simulation.result()
+
+# Live Dashboard
+# /dashboard/stream pushes dashboard stats over Server-Sent Events. One feed
+# per worker listens on the event bus, waits DASHBOARD_STREAM_DEBOUNCE_MS for
+# a burst of writes to settle, recomputes the stats once and sends every
+# connected client the fields that changed. It also recomputes every
+# DASHBOARD_STREAM_REFRESH_SECONDS, which picks up other workers' writes and
+# loans turning overdue. The feed only runs while someone is connected. Top
+# books are aggregated live so new loans show up; on large databases
+# DASHBOARD_TOP_BOOKS_FROM_SNAPSHOT=1 reads them from the analytics snapshot
+# instead, as of its last refresh.
+DASHBOARD_STREAM_DEBOUNCE = int(os.environ.get('DASHBOARD_STREAM_DEBOUNCE_MS', '500')) / 1000
+DASHBOARD_STREAM_REFRESH = int(os.environ.get('DASHBOARD_STREAM_REFRESH_SECONDS', '30'))
+DASHBOARD_STREAM_KEEPALIVE = 15
+DASHBOARD_TOP_BOOKS = 5
+DASHBOARD_TOP_BOOKS_FROM_SNAPSHOT = os.environ.get('DASHBOARD_TOP_BOOKS_FROM_SNAPSHOT', '0').lower() not in ('0', 'false', 'no')
+
+async def live_dashboard_state() -> dict:
+    stats = await flights.do("dashboard:stats", compute_dashboard_stats)
+    if DASHBOARD_TOP_BOOKS_FROM_SNAPSHOT:
+        top_books, _ = await analytics_rows(
+            "top-books", f"analytics:top-books:{DASHBOARD_TOP_BOOKS}",
+            lambda: top_books_from_snapshot(DASHBOARD_TOP_BOOKS), top_books_pipeline(DASHBOARD_TOP_BOOKS)
+        )
+    else:
+        top_books, _ = await analytics_rows(
+            "top-books", f"analytics:top-books-live:{DASHBOARD_TOP_BOOKS}",
+            None, top_books_pipeline(DASHBOARD_TOP_BOOKS)
+        )
+    return {**stats, "top_books": [
+        {"book_id": row["book_id"], "title": row.get("title"), "borrow_count": row["borrow_count"]}
+        for row in top_books
+    ]}
+
+class DashboardFeed:
+    def __init__(self):
+        self.clients = events.Fanout()
+        self.state = None
+        self.seq = 0
+        self.ready = None
+        self._task = None
+
+    async def subscribe(self) -> asyncio.Queue:
+        """A queue of SSE messages, starting with the full current state"""
+        queue = self.clients.add()
+        if self._task is None:
+            # Set once the first state is computed (or computing it failed)
+            self.ready = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+        await self.ready.wait()
+        if self.state is None:
+            self.clients.remove(queue)
+            raise HTTPException(status_code=503, detail="Dashboard stats unavailable")
+        queue.put_nowait(self.snapshot_message())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.clients.remove(queue)
+
+    def snapshot_message(self) -> bytes:
+        return events.sse("snapshot", self.state, self.seq, default=json_default)
+
+    async def update(self):
+        previous, self.state = self.state, await live_dashboard_state()
+        if previous is None:
+            return
+        delta = {key: value for key, value in self.state.items() if previous.get(key) != value}
+        if delta:
+            self.seq += 1
+            self.clients.send(events.sse("delta", delta, self.seq, default=json_default), self.snapshot_message())
+
+    async def run(self):
+        inbox = bus.subscribe()
+        try:
+            self.state = None
+            await self.update()
+            self.ready.set()
+            while self.clients:
+                try:
+                    await asyncio.wait_for(inbox.get(), DASHBOARD_STREAM_REFRESH)
+                    await asyncio.sleep(DASHBOARD_STREAM_DEBOUNCE)
+                    events.drain(inbox)
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    await self.update()
+                except Exception:
+                    logger.exception("Dashboard feed update failed")
+        except Exception:
+            logger.exception("Dashboard feed failed")
+        finally:
+            bus.unsubscribe(inbox)
+            self._task = None
+            self.ready.set()
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+
+dashboard_feed = DashboardFeed()
+
+@api_router.get("/dashboard/stream")
+async def stream_dashboard():
+    """Server-Sent Events: a `snapshot` of the dashboard, then `delta`s of what changed"""
+    queue = await dashboard_feed.subscribe()
     
-    book_stats = trans_df.groupby('book_id').size().reset_index(name='borrow_count')
-    book_stats = book_stats.merge(books_df[['book_id', 'title', 'author', 'genre']], on='book_id', how='left')
-    book_stats = book_stats.sort_values('borrow_count', ascending=False).head(limit)
+    async def messages():
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), DASHBOARD_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+        finally:
+            dashboard_feed.unsubscribe(queue)
     
-    return book_stats.to_dict('records')
+    return StreamingResponse(messages(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache", "X-Accel-Buffering": "no"
+    })
 
-@api_router.get("/analytics/genre-distribution")
-async def get_genre_distribution():
-    transactions = await db.transactions.find({}, {"_id": 0}).to_list(10000)
-    books = await db.books.find({}, {"_id": 0}).to_list(1000)
+# Reports
+TOP_BORROWER_COLUMNS = ['user_id', 'loan_count', 'total_fines', 'name', 'email', 'department']
+OVERDUE_COLUMNS = [
+    'transaction_id', 'user_id', 'user_name', 'user_email', 'book_id', 'book_title',
+    'issue_date', 'due_date', 'overdue_days', 'fine_amount'
+]
+OVERDUE_PAGE_SIZE = 1000
+
+def iter_overdue_rows(loop):
+    """Yield overdue rows page by page from a worker thread, fetching on the event loop"""
+    cursor = None
+    while True:
+        page, cursor = asyncio.run_coroutine_threadsafe(
+            fetch_overdue_page(OVERDUE_PAGE_SIZE, cursor), loop
+        ).result()
+        yield from page
+        if not cursor:
+            return
+
+def write_report_workbook(path: Path, top_borrowers: list, overdue_rows, fine_summary: Optional[dict]):
+    """Write the weekly report with openpyxl's write-only mode so rows are streamed to disk.
+
+    Layout matches the original pandas export: one sheet per section, and the
+    Fine Summary sheet stacks the summary, department and genre tables with
+    two blank rows between them.
+    """
+    import openpyxl
     
-    trans_df = pd.DataFrame(transactions)
-    books_df = pd.DataFrame(books)
+    workbook = openpyxl.Workbook(write_only=True)
     
-    if trans_df.empty or books_df.empty:
-        return []
+    # Sheet 1: Top Borrowers
+    if top_borrowers:
+        sheet = workbook.create_sheet('Top Borrowers')
+        sheet.append(TOP_BORROWER_COLUMNS)
+        for row in top_borrowers:
+            sheet.append([row.get(column) for column in TOP_BORROWER_COLUMNS])
     
-    trans_with_books = trans_df.merge(books_df[['book_id', 'genre']], on='book_id', how='left')
-    genre_stats = trans_with_books.groupby('genre').size().reset_index(name='count')
-    genre_stats = genre_stats.sort_values('count', ascending=False)
+    # Sheet 2: Overdue List
+    first_overdue = next(overdue_rows, None)
+    if first_overdue:
+        sheet = workbook.create_sheet('Overdue List')
+        sheet.append(OVERDUE_COLUMNS)
+        sheet.append([first_overdue[column] for column in OVERDUE_COLUMNS])
+        for row in overdue_rows:
+            sheet.append([row[column] for column in OVERDUE_COLUMNS])
     
-    return genre_stats.to_dict('records')
-
-@api_router.get("/analytics/overdue-list")
-async def get_overdue_list():
-    transactions = await db.transactions.find({"status": "issued"}, {"_id": 0}).to_list(10000)
-    books = await db.books.find({}, {"_id": 0}).to_list(1000)
-    users = await db.users.find({}, {"_id": 0}).to_list(1000)
+    # Sheet 3: Fine Totals
+    if fine_summary:
+        sheet = workbook.create_sheet('Fine Summary')
+        for title, columns, rows in fine_summary['tables']:
+            if title != 'Summary':
+                sheet.append([])
+                sheet.append([])
+            sheet.append(columns)
+            for row in rows:
+                sheet.append([row[column] for column in columns])
     
-    trans_df = pd.DataFrame(transactions)
-    books_df = pd.DataFrame(books)
-    users_df = pd.DataFrame(users)
+    if not workbook.worksheets:
+        workbook.create_sheet('Summary').append(['No library data available'])
     
-    if trans_df.empty:
-        return []
+    workbook.save(path)
+
+def purge_expired_reports():
+    """Delete report files older than the retention window"""
+    cutoff = datetime.now().timestamp() - REPORT_RETENTION.total_seconds()
+    for report in REPORTS_DIR.glob('*.xlsx'):
+        if report.stat().st_mtime < cutoff:
+            report.unlink(missing_ok=True)
+
+async def fine_summary_from_mongo() -> dict:
+    """Same shape as fine_summary_from_table, aggregated in MongoDB"""
+    archived = await has_archive()
+    totals = await db.transactions.aggregate(with_archive(FINE_TOTALS_PIPELINE, archived)).to_list(None)
+    if not totals:
+        return {"totals": None, "departments": [], "genres": []}
+    return {
+        "totals": totals[0],
+        "departments": await db.transactions.aggregate(
+            with_archive(fines_by_department_pipeline(), archived), allowDiskUse=True
+        ).to_list(None),
+        "genres": await db.transactions.aggregate(
+            with_archive(fines_by_genre_pipeline(), archived), allowDiskUse=True
+        ).to_list(None),
+    }
+
+async def build_weekly_report(job_id: str) -> dict:
+    """Report job: aggregate (from the snapshot if there is one, else in MongoDB),
+    then stream the workbook to disk on the job pool"""
+    loaded = await from_snapshot(fine_summary_from_table)
+    if loaded:
+        fines, snapshot_at = loaded
+        top_borrowers, _ = await top_borrowers_from_snapshot(20)
+    else:
+        fines, snapshot_at = await fine_summary_from_mongo(), None
+        top_borrowers = await db.transactions.aggregate(
+            with_archive(top_borrowers_pipeline(20), await has_archive()), allowDiskUse=True
+        ).to_list(None)
     
-    now = datetime.now(timezone.utc).replace(tzinfo=None)
-    overdue_list = []
+    fine_summary = None
+    if fines['totals']:
+        total_fines = fines['totals']['total_fines']
+        transaction_count = fines['totals']['transaction_count']
+        # Fines charged on returned loans plus those accrued so far on open ones
+        summary = [
+            {'Metric': 'Total Fines (collected + accrued)', 'Value': f"₹{total_fines:.2f}"},
+            {'Metric': 'Total Transactions', 'Value': transaction_count},
+            {'Metric': 'Average Fine per Transaction (collected + accrued)',
+             'Value': f"₹{total_fines/transaction_count:.2f}" if transaction_count > 0 else "₹0.00"},
+        ]
+        fine_summary = {'tables': [
+            ('Summary', ['Metric', 'Value'], summary),
+            ('Department', ['Department', 'Total Fines'], fines['departments']),
+            ('Genre', ['Genre', 'Total Fines'], fines['genres']),
+        ]}
+    await jobs.update_progress(db, job_id, stage="writing")
     
-    for _, row in trans_df.iterrows():
-        due_date = datetime.fromisoformat(row['due_date']).replace(tzinfo=None)
-        if now > due_date:
-            overdue_days = (now - due_date).days
-            fine = calculate_fine(row['due_date'], None, FINE_CONFIG['grace_period_days'])
-            
-            book = books_df[books_df['book_id'] == row['book_id']].iloc[0].to_dict() if not books_df[books_df['book_id'] == row['book_id']].empty else {}
-            user = users_df[users_df['user_id'] == row['user_id']].iloc[0].to_dict() if not users_df[users_df['user_id'] == row['user_id']].empty else {}
-            
-            overdue_list.append({
-                'transaction_id': row['transaction_id'],
-                'user_id': row['user_id'],
-                'user_name': user.get('name', 'N/A'),
-                'user_email': user.get('email', 'N/A'),
-                'book_id': row['book_id'],
-                'book_title': book.get('title', 'N/A'),
-                'issue_date': row['issue_date'],
-                'due_date': row['due_date'],
-                'overdue_days': overdue_days,
-                'fine_amount': fine
-            })
-    
-    return sorted(overdue_list, key=lambda x: x['overdue_days'], reverse=True)
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = REPORTS_DIR / f"{job_id}.xlsx"
+    await jobs.run_in_pool(
+        write_report_workbook, path, top_borrowers,
+        iter_overdue_rows(asyncio.get_running_loop()), fine_summary
+    )
+    return {
+        "filename": f"library_report_{datetime.now().strftime('%Y-%m-%d')}.xlsx",
+        "size_bytes": path.stat().st_size,
+        # The file is only on this host unless REPORTS_DIR is shared
+        "host": socket.gethostname(),
+        # Overdue loans are always live; the other sheets are as of this time
+        "snapshot_at": snapshot_at
+    }
 
-# Reports
-@api_router.post("/reports/generate")
+@api_router.post("/reports/generate", status_code=202)
 async def generate_weekly_report():
-    """Generate Excel report with multiple sheets"""
-    try:
-        # Fetch all data
-        transactions = await db.transactions.find({}, {"_id": 0}).to_list(10000)
-        books = await db.books.find({}, {"_id": 0}).to_list(1000)
-        users = await db.users.find({}, {"_id": 0}).to_list(1000)
-        
-        trans_df = pd.DataFrame(transactions)
-        books_df = pd.DataFrame(books)
-        users_df = pd.DataFrame(users)
-        
-        # Create Excel writer
-        output = BytesIO()
-        writer = pd.ExcelWriter(output, engine='openpyxl')
-        
-        # Sheet 1: Top Borrowers
-        if not trans_df.empty:
-            borrower_stats = trans_df.groupby('user_id').agg({
-                'transaction_id': 'count',
-                'fine_amount': 'sum'
-            }).reset_index()
-            borrower_stats.columns = ['user_id', 'loan_count', 'total_fines']
-            borrower_stats = borrower_stats.merge(
-                users_df[['user_id', 'name', 'email', 'department']], 
-                on='user_id', 
-                how='left'
-            )
-            borrower_stats = borrower_stats.sort_values('loan_count', ascending=False).head(20)
-            borrower_stats.to_excel(writer, sheet_name='Top Borrowers', index=False)
-        
-        # Sheet 2: Overdue List
-        overdue_data = await get_overdue_list()
-        if overdue_data:
-            overdue_df = pd.DataFrame(overdue_data)
-            overdue_df.to_excel(writer, sheet_name='Overdue List', index=False)
-        
-        # Sheet 3: Fine Totals
-        if not trans_df.empty:
-            total_fines = trans_df['fine_amount'].sum()
-            
-            # By department
-            trans_with_users = trans_df.merge(users_df[['user_id', 'department']], on='user_id', how='left')
-            dept_fines = trans_with_users.groupby('department')['fine_amount'].sum().reset_index()
-            dept_fines.columns = ['Department', 'Total Fines']
-            
-            # By genre
-            trans_with_books = trans_df.merge(books_df[['book_id', 'genre']], on='book_id', how='left')
-            genre_fines = trans_with_books.groupby('genre')['fine_amount'].sum().reset_index()
-            genre_fines.columns = ['Genre', 'Total Fines']
-            
-            # Summary
-            summary_df = pd.DataFrame({
-                'Metric': ['Total Fines Collected', 'Total Transactions', 'Average Fine per Transaction'],
-                'Value': [f"₹{total_fines:.2f}", len(trans_df), f"₹{total_fines/len(trans_df):.2f}" if len(trans_df) > 0 else "₹0.00"]
-            })
-            
-            summary_df.to_excel(writer, sheet_name='Fine Summary', index=False, startrow=0)
-            dept_fines.to_excel(writer, sheet_name='Fine Summary', index=False, startrow=len(summary_df)+3)
-            genre_fines.to_excel(writer, sheet_name='Fine Summary', index=False, startrow=len(summary_df)+len(dept_fines)+6)
-        
-        writer.close()
-        output.seek(0)
-        
-        # Convert to base64 for frontend
-        import base64
-        file_content = output.read()
-        base64_content = base64.b64encode(file_content).decode('utf-8')
-        
-        return {
-            "success": True,
-            "filename": f"library_report_{datetime.now().strftime('%Y-%m-%d')}.xlsx",
-            "content": base64_content
-        }
+    """Start an Excel report job; poll /reports/jobs/{job_id} and download when done"""
+    if REPORTS_DIR.exists():
+        await jobs.run_in_pool(purge_expired_reports)
+    job = await jobs.start_job(db, "report", build_weekly_report, timeout=REPORT_JOB_TIMEOUT)
+    return jobs.public_job(job)
+
+@api_router.get("/reports/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    job = await jobs.get_job(db, job_id)
+    if not job or job["kind"] != "report":
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return jobs.public_job(job)
+
+@api_router.get("/reports/jobs/{job_id}/download")
+async def download_report(job_id: str):
+    job = await jobs.get_job(db, job_id)
+    if not job or job["kind"] != "report":
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Report is {job['status']}")
     
-    except Exception as e:
-        logger.error(f"Error generating report: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    path = REPORTS_DIR / f"{job_id}.xlsx"
+    if not path.exists():
+        host = job["result"].get("host")
+        if host and host != socket.gethostname():
+            raise HTTPException(
+                status_code=421,
+                detail=f"Report was written on {host}; share REPORTS_DIR across hosts to download it from any of them"
+            )
+        raise HTTPException(status_code=410, detail="Report file has expired")
+    return FileResponse(path, media_type=XLSX_MEDIA_TYPE, filename=job["result"]["filename"])
 
 app.include_router(api_router)
 
@@ -578,6 +2387,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Snapshot-At"],
 )
 
 logging.basicConfig(
@@ -586,11 +2396,95 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("startup")
-async def startup_event():
-    await import_initial_data()
-    logger.info("Application started")
+@app.get("/health/live")
+async def health_live():
+    return {"status": "alive", "worker": WORKER_ID}
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    """Ready once this worker has its indexes and no data import is in progress.
+
+    An import that failed part-way (an incomplete checkpoint with nobody
+    holding the import lease) is reported but does not fail readiness: no
+    worker would ever clear it. It resumes on the next `manage.py import`
+    or restart.
+    """
+    checks = {"indexes": readiness["indexes"]}
+    interrupted = False
+    try:
+        await db.command("ping")
+        checks["database"] = True
+        importing = await jobs.lease_holder(db, IMPORT_LEASE)
+        checks["data"] = not importing
+        if not importing:
+            interrupted = await db.import_checkpoints.find_one({"completed": False}, {"_id": 1}) is not None
+    except Exception as e:
+        logger.warning(f"Readiness check failed: {e}")
+        checks["database"] = False
+        checks["data"] = False
+    
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if ready else "not ready",
+        "worker": WORKER_ID,
+        "checks": checks,
+        "import_interrupted": interrupted,
+    }
+
+# Instrumentation
+# Every request is timed per route template (not raw path, which would label
+# each book or user ID separately). With PROFILE_SLOW_REQUESTS_MS set, requests
+# are run under cProfile and those slower than the threshold have their stats
+# dumped to PROFILE_DIR for `python -m pstats` or snakeviz. cProfile watches the
+# whole event-loop thread, so one request is profiled at a time and its dump
+# also shows whatever else the loop ran meanwhile.
+PROFILE_SLOW_REQUESTS_MS = int(os.environ.get('PROFILE_SLOW_REQUESTS_MS', '0'))
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', Path(tempfile.gettempdir()) / 'library_profiles'))
+profiling = {"active": False}
+
+def route_template(scope) -> str:
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+def dump_profile(profiler: cProfile.Profile, method: str, route: str, elapsed: float) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    slug = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+    path = PROFILE_DIR / f"{utc_now():%Y%m%dT%H%M%S%f}-{method}-{slug}-{elapsed * 1000:.0f}ms.prof"
+    profiler.dump_stats(path)
+    return path
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    labels = {"method": request.method, "route": route_template(request.scope)}
+    profiler = None
+    if PROFILE_SLOW_REQUESTS_MS > 0 and not profiling["active"]:
+        profiling["active"] = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    REQUESTS_IN_FLIGHT.inc(**labels)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        REQUESTS_IN_FLIGHT.dec(**labels)
+        REQUEST_LATENCY.observe(elapsed, status=str(status), **labels)
+        if profiler:
+            profiler.disable()
+            profiling["active"] = False
+            if elapsed * 1000 >= PROFILE_SLOW_REQUESTS_MS:
+                path = dump_profile(profiler, labels["method"], labels["route"], elapsed)
+                logger.warning(f"Slow request {labels['method']} {request.url.path} took {elapsed:.3f}s, profile: {path}")
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+@app.get("/metrics")
+async def get_metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
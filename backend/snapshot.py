@@ -0,0 +1,217 @@
+"""Columnar snapshot of loan history for analytics and reports.
+
+Transactions (hot and archived), joined with book genre and user
+department, are written as Arrow IPC files on local disk and memory-mapped
+for reads, so heavy aggregations run over columns instead of millions of
+Mongo documents.
+
+Returned loans never change again, so they are appended in parts: each
+refresh adds the loans returned since the previous one. Open loans still
+change (accrued fines, returns) and are rewritten whole each refresh. A
+manifest, replaced atomically, names the files that make up the current
+snapshot; readers only ever see a complete one.
+"""
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import jobs
+
+COLUMNS = [
+    "transaction_id", "user_id", "book_id", "genre", "department", "status",
+    "issue_date", "due_date", "return_date", "fine",
+]
+MANIFEST = "manifest.json"
+
+# Returns committed slightly out of timestamp order are caught by re-reading
+# this window on every refresh; loans already appended in it are skipped.
+RETURN_OVERLAP = timedelta(minutes=5)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def read_manifest(directory: Path):
+    try:
+        with open(directory / MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(directory: Path, manifest: dict):
+    tmp = directory / f".{MANIFEST}.{uuid.uuid4().hex}"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, directory / MANIFEST)
+
+
+def _write_part(directory: Path, kind: str, rows: dict) -> str:
+    """Write column lists as an uncompressed Arrow IPC file; returns its file name"""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    schema = pa.schema([
+        ("transaction_id", pa.string()), ("user_id", pa.string()), ("book_id", pa.string()),
+        ("genre", pa.string()), ("department", pa.string()), ("status", pa.string()),
+        ("issue_date", pa.timestamp("ms")), ("due_date", pa.timestamp("ms")),
+        ("return_date", pa.timestamp("ms")), ("fine", pa.float64()),
+    ])
+    table = pa.Table.from_pydict(rows, schema=schema)
+    name = f"{kind}-{uuid.uuid4().hex}.arrow"
+    with pa.OSFile(str(directory / name), "wb") as sink:
+        with ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+    return name
+
+
+def load_table(directory: Path, manifest: dict):
+    """Every part of the snapshot as one table, memory-mapped rather than read into RAM"""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    tables = [
+        ipc.open_file(pa.memory_map(str(directory / name))).read_all()
+        for name in manifest["closed_parts"] + [manifest["open_part"]]
+    ]
+    return pa.concat_tables(tables)
+
+
+async def _collect(db, sources, lookups: dict) -> dict:
+    """Stream transactions from (collection, query) sources into column lists"""
+    rows = {column: [] for column in COLUMNS}
+    projection = {"_id": 0, "fine_amount": 1, "accrued_fine": 1}
+    projection.update({column: 1 for column in COLUMNS if column not in ("genre", "department", "fine")})
+    for collection, query in sources:
+        async for trans in db[collection].find(query, projection):
+            is_open = trans.get("status") == "issued"
+            rows["transaction_id"].append(trans["transaction_id"])
+            rows["user_id"].append(trans.get("user_id"))
+            rows["book_id"].append(trans.get("book_id"))
+            rows["genre"].append(lookups["genre"].get(trans.get("book_id")))
+            rows["department"].append(lookups["department"].get(trans.get("user_id")))
+            rows["status"].append(trans.get("status"))
+            rows["issue_date"].append(trans.get("issue_date"))
+            rows["due_date"].append(trans.get("due_date"))
+            rows["return_date"].append(trans.get("return_date"))
+            rows["fine"].append(float(trans.get("accrued_fine" if is_open else "fine_amount") or 0))
+    return rows
+
+
+async def _lookups(db) -> dict:
+    """book_id -> genre and user_id -> department, joined onto every row"""
+    books = db.books.find({}, {"_id": 0, "book_id": 1, "genre": 1})
+    users = db.users.find({}, {"_id": 0, "user_id": 1, "department": 1})
+    return {
+        "genre": {book["book_id"]: book.get("genre") async for book in books},
+        "department": {user["user_id"]: user.get("department") async for user in users},
+    }
+
+
+def _overlap(rows: dict, since: datetime) -> dict:
+    """transaction_id -> return date for appended loans returned after `since`"""
+    return {
+        transaction_id: returned.isoformat()
+        for transaction_id, returned in zip(rows["transaction_id"], rows["return_date"])
+        if returned and returned >= since
+    }
+
+
+async def refresh(db, directory: Path, archive_collections: list, full: bool = False,
+                  max_parts: int = 16, max_age: timedelta = timedelta(hours=24)) -> dict:
+    """Bring the snapshot up to date and return its manifest.
+
+    Appends loans returned since the last refresh and rewrites open loans. A
+    full rebuild (which also picks up book/user edits and archiving) happens
+    when asked, when there is no snapshot yet, when it has more than
+    `max_parts` parts or when the last full build is older than `max_age`.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(directory)
+    started = _now()
+    if manifest and not full:
+        built_at = datetime.fromisoformat(manifest["built_at"])
+        full = len(manifest["closed_parts"]) >= max_parts or started - built_at > max_age
+    lookups = await _lookups(db)
+
+    if not manifest or full:
+        closed = await _collect(
+            db,
+            [("transactions", {"status": {"$ne": "issued"}})] + [(name, {}) for name in archive_collections],
+            lookups
+        )
+        closed_parts = [await jobs.run_in_pool(_write_part, directory, "closed", closed)]
+        overlap = _overlap(closed, started - RETURN_OVERLAP)
+        built_at = started
+    else:
+        since = datetime.fromisoformat(manifest["refreshed_at"]) - RETURN_OVERLAP
+        closed = await _collect(db, [("transactions", {
+            "status": "returned",
+            "return_date": {"$gte": since},
+            "transaction_id": {"$nin": list(manifest["overlap"])},
+        })], lookups)
+        closed_parts = list(manifest["closed_parts"])
+        if closed["transaction_id"]:
+            closed_parts.append(await jobs.run_in_pool(_write_part, directory, "closed", closed))
+        cutoff = (started - RETURN_OVERLAP).isoformat()
+        overlap = {
+            **{key: value for key, value in manifest["overlap"].items() if value >= cutoff},
+            **_overlap(closed, started - RETURN_OVERLAP),
+        }
+        built_at = datetime.fromisoformat(manifest["built_at"])
+
+    opened = await _collect(db, [("transactions", {"status": "issued"})], lookups)
+    open_part = await jobs.run_in_pool(_write_part, directory, "open", opened)
+
+    new_manifest = {
+        "built_at": built_at.isoformat(),
+        "refreshed_at": started.isoformat(),
+        "closed_parts": closed_parts,
+        "open_part": open_part,
+        "overlap": overlap,
+    }
+    _write_manifest(directory, new_manifest)
+
+    # Readers that already mapped a replaced file keep it until they are done
+    keep = set(closed_parts) | {open_part}
+    for path in directory.glob("*.arrow"):
+        if path.name not in keep:
+            path.unlink(missing_ok=True)
+    return new_manifest
+
+
+# Aggregations
+# Each returns plain Python rows shaped like the matching Mongo pipeline's output.
+def top_counts(table, key: str, limit: int) -> list:
+    """Loan count and total fine per `key`, most loans first"""
+    grouped = table.group_by(key).aggregate([("transaction_id", "count"), ("fine", "sum")])
+    grouped = grouped.sort_by([("transaction_id_count", "descending"), (key, "ascending")]).slice(0, limit)
+    return [
+        {key: row[key], "count": row["transaction_id_count"], "fines": row["fine_sum"]}
+        for row in grouped.to_pylist()
+    ]
+
+
+def totals_by(table, field: str, order_by_value: bool = False) -> list:
+    """Loan count and total fine per `field`, skipping rows without one"""
+    import pyarrow.compute as pc
+
+    table = table.filter(pc.is_valid(table[field]))
+    grouped = table.group_by(field).aggregate([("transaction_id", "count"), ("fine", "sum")])
+    order = [("transaction_id_count", "descending"), (field, "ascending")] if order_by_value else [(field, "ascending")]
+    return [
+        {field: row[field], "count": row["transaction_id_count"], "fines": row["fine_sum"]}
+        for row in grouped.sort_by(order).to_pylist()
+    ]
+
+
+def fine_totals(table):
+    """Total fine and loan count, or None for an empty snapshot"""
+    import pyarrow.compute as pc
+
+    if not table.num_rows:
+        return None
+    return {"total_fines": pc.sum(table["fine"]).as_py(), "transaction_count": table.num_rows}
@@ -0,0 +1,173 @@
+"""Synthetic library datasets in the CSV shape `import_initial_data` reads.
+
+Generates books.csv, users.csv and transactions.csv (plus dataset.json
+describing how they were made) for a given number of transactions. The same
+size, seed and as-of date always give the same files.
+
+The shape aims at a real campus library rather than uniform noise: book and
+borrower popularity are long-tailed (and unrelated to ID order), loans run
+LOAN_DAYS, most returns are on time and a minority late, and a slice of loans
+is still open on the as-of date, some of them overdue. Open loans are spread
+evenly over the catalog and never exceed a book's copies.
+
+Usage:
+    python benchmarks/datasets.py 100k [--out benchmarks/data/100k] [--seed 7] [--as-of 2025-01-31]
+"""
+import argparse
+import json
+from datetime import date
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+LOAN_DAYS = 14
+HISTORY_DAYS = 730
+OPEN_RATIO = 0.08          # loans still out on the as-of date
+OVERDUE_OPEN_RATIO = 0.3   # of those, past their due date
+LATE_RETURN_RATIO = 0.15   # returned loans brought back after their due date
+MEAN_DAYS_LATE = 9
+
+GENRES = [
+    "Fiction", "Science", "History", "Technology", "Mathematics", "Philosophy",
+    "Biography", "Poetry", "Economics", "Engineering", "Art", "Mystery",
+]
+DEPARTMENTS = ["Computer Science", "Electronics", "Mechanical", "Civil", "MBA", "Arts"]
+TITLE_WORDS = [
+    "Silent", "River", "Quantum", "Empire", "Garden", "Algorithms", "Shadow", "Modern",
+    "Ocean", "Theory", "Winter", "Machines", "Ancient", "Light", "Structures", "Journey",
+    "Hidden", "Systems", "Golden", "Networks", "Forgotten", "Signals", "Crimson", "Design",
+]
+FIRST_NAMES = [
+    "Aarav", "Diya", "Ishaan", "Meera", "Kabir", "Ananya", "Rohan", "Saanvi", "Vivaan", "Priya",
+    "Arjun", "Kavya", "Aditya", "Neha", "Rahul", "Sneha", "Karan", "Pooja", "Nikhil", "Riya",
+]
+LAST_NAMES = [
+    "Sharma", "Patel", "Iyer", "Reddy", "Gupta", "Nair", "Singh", "Das", "Menon", "Joshi",
+    "Kulkarni", "Bose", "Rao", "Chopra", "Mehta", "Pillai",
+]
+
+
+def parse_size(value: str) -> int:
+    return SIZES.get(value.lower()) or int(value)
+
+
+def long_tail(rng, count: int, size: int, skew: float):
+    """`size` indexes into range(count), a few of them drawn far more often than the rest"""
+    import numpy as np
+
+    weights = 1.0 / np.arange(1, count + 1) ** skew
+    return rng.permutation(count)[rng.choice(count, size=size, p=weights / weights.sum())]
+
+
+def generate(transactions: int, out: Path, seed: int = 7, as_of: date = None) -> dict:
+    """Write the three CSVs for `transactions` loans into `out`; returns the dataset description"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    as_of = as_of or date.today()
+    today = np.datetime64(as_of, "D")
+    n_books = max(transactions // 10, 50)
+    n_users = max(transactions // 25, 20)
+
+    # Transactions
+    book_idx = long_tail(rng, n_books, transactions, skew=0.8)
+    user_idx = long_tail(rng, n_users, transactions, skew=0.6)
+    is_open = rng.random(transactions) < OPEN_RATIO
+    book_idx[is_open] = rng.integers(0, n_books, is_open.sum())
+    is_overdue = is_open & (rng.random(transactions) < OVERDUE_OPEN_RATIO)
+    is_late = ~is_open & (rng.random(transactions) < LATE_RETURN_RATIO)
+
+    days_late = rng.geometric(1 / MEAN_DAYS_LATE, transactions)
+    kept = np.where(is_late, LOAN_DAYS + days_late, rng.integers(1, LOAN_DAYS + 1, transactions))
+    age = np.where(
+        is_open,
+        # Open loans: due in the future, or `days_late` past due
+        np.where(is_overdue, LOAN_DAYS + days_late, rng.integers(0, LOAN_DAYS, transactions)),
+        # Returned loans: issued anywhere in the history, returned by today
+        kept + rng.integers(0, HISTORY_DAYS, transactions),
+    )
+    issue = today - age.astype("timedelta64[D]")
+    due = issue + np.timedelta64(LOAN_DAYS, "D")
+    returned = issue + kept.astype("timedelta64[D]")
+
+    order = np.argsort(issue, kind="stable")
+    issue, due, returned = issue[order], due[order], returned[order]
+    book_idx, user_idx, is_open = book_idx[order], user_idx[order], is_open[order]
+    return_dates = np.where(is_open, "", returned.astype(str))
+
+    trans_df = pd.DataFrame({
+        "transaction_id": np.char.add("T", np.char.zfill(np.arange(1, transactions + 1).astype(str), 8)),
+        "book_id": np.char.add("B", np.char.zfill(book_idx.astype(str), 6)),
+        "user_id": np.char.add("U", np.char.zfill(user_idx.astype(str), 6)),
+        "issue_date": issue.astype(str),
+        "due_date": due.astype(str),
+        "return_date": return_dates,
+    })
+
+    # Books: enough copies for every open loan
+    on_loan = np.bincount(book_idx[is_open], minlength=n_books)
+    total_copies = np.maximum(rng.integers(1, 6, n_books), on_loan)
+    words = rng.choice(TITLE_WORDS, size=(n_books, 2))
+    books_df = pd.DataFrame({
+        "book_id": np.char.add("B", np.char.zfill(np.arange(n_books).astype(str), 6)),
+        "title": [f"{first} {second} {i}" for i, (first, second) in enumerate(words)],
+        "author": [f"Author {i}" for i in rng.integers(0, max(n_books // 5, 1), n_books)],
+        "genre": rng.choice(GENRES, n_books),
+        "available_copies": total_copies - on_loan,
+        "total_copies": total_copies,
+        "shelf_location": [f"{chr(65 + i % 26)}{i % 40 + 1}" for i in range(n_books)],
+    })
+
+    users_df = pd.DataFrame({
+        "user_id": np.char.add("U", np.char.zfill(np.arange(n_users).astype(str), 6)),
+        "name": [f"{first} {last}" for first, last in zip(
+            rng.choice(FIRST_NAMES, n_users), rng.choice(LAST_NAMES, n_users)
+        )],
+        "email": [f"user{i}@campus.edu" for i in range(n_users)],
+        "phone": rng.integers(6_000_000_000, 9_999_999_999, n_users),
+        "department": rng.choice(DEPARTMENTS, n_users),
+        "semester": rng.integers(1, 9, n_users),
+    })
+
+    out.mkdir(parents=True, exist_ok=True)
+    books_df.to_csv(out / "books.csv", index=False)
+    users_df.to_csv(out / "users.csv", index=False)
+    trans_df.to_csv(out / "transactions.csv", index=False)
+
+    description = {
+        "transactions": transactions,
+        "books": n_books,
+        "users": n_users,
+        "seed": seed,
+        "as_of": as_of.isoformat(),
+        "open_loans": int(is_open.sum()),
+        "overdue_loans": int((is_open & (due < today)).sum()),
+        "late_returns": int(is_late.sum()),
+    }
+    (out / "dataset.json").write_text(json.dumps(description, indent=2))
+    return description
+
+
+def sources(directory: Path) -> dict:
+    """The dataset's CSVs as `import_initial_data` sources"""
+    return {name: str(directory / f"{name}.csv") for name in ("books", "users", "transactions")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("size", help=f"Number of transactions, or one of {', '.join(SIZES)}")
+    parser.add_argument("--out", type=Path, help="Output directory (default benchmarks/data/<size>)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--as-of", type=date.fromisoformat, help="Date the data is current to (default today)")
+    args = parser.parse_args()
+
+    out = args.out or DATA_DIR / args.size.lower()
+    description = generate(parse_size(args.size), out, seed=args.seed, as_of=args.as_of)
+    print(json.dumps(description, indent=2))
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
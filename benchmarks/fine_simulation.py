@@ -0,0 +1,127 @@
+"""Fine policy simulation benchmark: re-pricing a full loan history in memory.
+
+Reads a synthetic dataset (benchmarks/datasets.py) straight from its CSVs and
+times the pricing side of /api/fines/simulate under the current policy plus
+`--policies` candidates, over both of its inputs:
+
+- snapshot: an Arrow table shaped like the analytics snapshot
+- mongo: batches of transaction documents as the driver returns them (the
+  time spent reading them from MongoDB is not included; measure that with
+  `load.py --only fine-simulation --mongo-url ...`)
+
+Usage:
+    python benchmarks/fine_simulation.py [--size 1m | --dataset DIR] [--policies 3] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import datasets
+from load import BACKEND_DIR
+
+
+def candidates(count: int) -> list:
+    """`count` variations on the default policy: longer grace periods, steeper top tiers"""
+    return [
+        {
+            "grace_period_days": 5 + i,
+            "tiers": [
+                {"days_start": 1, "days_end": 7, "rate_per_day": 2},
+                {"days_start": 8, "days_end": 14, "rate_per_day": 5 + i},
+                {"days_start": 15, "days_end": None, "rate_per_day": 10 + 5 * i},
+            ],
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def load_loans(dataset: Path):
+    books = pd.read_csv(dataset / "books.csv", usecols=["book_id", "genre"])
+    users = pd.read_csv(dataset / "users.csv", usecols=["user_id", "department"])
+    loans = pd.read_csv(dataset / "transactions.csv", usecols=["book_id", "user_id", "due_date", "return_date"])
+    loans["due_date"] = pd.to_datetime(loans["due_date"])
+    loans["return_date"] = pd.to_datetime(loans["return_date"])
+    genres = dict(zip(books["book_id"], books["genre"]))
+    departments = dict(zip(users["user_id"], users["department"]))
+    return loans, departments, genres
+
+
+def pydatetime(value):
+    """A pandas timestamp as the naive datetime (or None) pymongo would return"""
+    return None if value is pd.NaT else value.to_pydatetime()
+
+
+def best_of(repeat: int, run) -> tuple:
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="1m", help=f"Dataset to generate if missing: {', '.join(datasets.SIZES)} or a number")
+    parser.add_argument("--dataset", type=Path, help="Use an existing dataset directory instead")
+    parser.add_argument("--policies", type=int, default=3, help="Candidate policies besides the current one")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    dataset = args.dataset or datasets.DATA_DIR / args.size.lower()
+    if not (dataset / "dataset.json").exists():
+        print(f"Generating {dataset}")
+        datasets.generate(datasets.parse_size(args.size), dataset)
+
+    os.environ.update({
+        "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+        "DB_NAME": "library_fine_simulation",
+        "SNAPSHOT_DIR": tempfile.gettempdir(),
+    })
+    sys.path.insert(0, str(BACKEND_DIR))
+    import pyarrow as pa
+
+    import server
+
+    loans, departments, genres = load_loans(dataset)
+    policies = [{"version": 0, **server.FINE_CONFIG}] + candidates(args.policies)
+    as_of = server.utc_now()
+
+    table = pa.table({
+        "due_date": pa.array(loans["due_date"], pa.timestamp("ms")),
+        "return_date": pa.array(loans["return_date"], pa.timestamp("ms")),
+        "department": pa.array(loans["user_id"].map(departments), pa.string()),
+        "genre": pa.array(loans["book_id"].map(genres), pa.string()),
+    })
+    documents = [
+        {"user_id": user_id, "book_id": book_id, "due_date": pydatetime(due), "return_date": pydatetime(returned)}
+        for user_id, book_id, due, returned in zip(loans["user_id"], loans["book_id"], loans["due_date"], loans["return_date"])
+    ]
+    del loans
+
+    def from_table():
+        return server.simulate_fines_over_table(table, server.FineSimulation(policies, as_of)).result()
+
+    def from_documents():
+        simulation = server.FineSimulation(policies, as_of)
+        batch_size = server.FINE_SIMULATION_BATCH_SIZE
+        for start in range(0, len(documents), batch_size):
+            simulation.add_documents(documents[start:start + batch_size], departments, genres)
+        return simulation.result()
+
+    print(f"{len(documents)} loans, {len(policies)} policies")
+    results = {}
+    for name, run in (("snapshot", from_table), ("mongo", from_documents)):
+        elapsed, results[name] = best_of(args.repeat, run)
+        print(f"{name:<10} {elapsed:>7.2f}s  {len(documents) / elapsed / 1e6:>5.2f}M loans/s")
+    assert [p["total_fines"] for p in results["snapshot"]["policies"]] == \
+        [p["total_fines"] for p in results["mongo"]["policies"]]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Endpoint load benchmark over a synthetic library dataset.
+
+Imports a dataset from benchmarks/datasets.py into a scratch database, then
+drives each API scenario through the ASGI app in-process (no HTTP server, so
+the numbers are the app and database cost alone) with a fixed number of
+concurrent clients. Reports p50/p95/p99 latency, throughput and peak RSS per
+scenario, and can write the results as a JSON baseline and compare a run
+against an earlier one.
+
+By default the database is an in-memory mongomock stand-in, which is fine for
+the 10k dataset and for comparing app-side changes; pass --mongo-url for a
+local mongod (needed for text search and anything from 100k up). A scratch
+database is created there and dropped afterwards. Caching and the analytics
+snapshot are off unless CACHE_ENABLED / SNAPSHOT_REFRESH_SECONDS say otherwise,
+so analytics timings are the cost of computing them.
+
+Usage:
+    python benchmarks/load.py [--size 10k | --dataset DIR] [--mongo-url mongodb://localhost:27017]
+        [--requests 200] [--concurrency 10] [--only top-books,dashboard]
+        [--json baseline.json] [--compare old.json] [--tolerance 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+import datasets
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+@dataclass
+class Scenario:
+    name: str
+    request: Callable  # (client, context) -> awaitable httpx.Response
+    requests: Optional[int] = None  # overrides --requests
+    concurrency: Optional[int] = None  # overrides --concurrency
+    mongod_only: bool = False
+
+
+async def issue(client, context):
+    book_id = random.choice(context["available_books"])
+    response = await client.post("/api/transactions/issue", json={
+        "book_id": book_id, "user_id": random.choice(context["user_ids"])
+    })
+    if response.status_code == 200:
+        context["issued"].append(response.json()["transaction_id"])
+    elif response.status_code == 400 and book_id in context["available_books"]:
+        # Out of copies
+        context["available_books"].remove(book_id)
+    return response
+
+
+async def return_loan(client, context):
+    return await client.post("/api/transactions/return", json={"transaction_id": context["issued"].pop()})
+
+
+async def weekly_report(client, context):
+    """Start a report job and wait for it; the latency is the whole job"""
+    response = await client.post("/api/reports/generate")
+    job_id = response.json()["job_id"]
+    while True:
+        response = await client.get(f"/api/reports/jobs/{job_id}")
+        if response.json()["status"] in ("done", "failed"):
+            return response
+        await asyncio.sleep(0.05)
+
+
+def pick(context, key):
+    return random.choice(context[key])
+
+
+SCENARIOS = [
+    Scenario("books-page", lambda c, ctx: c.get("/api/books", params={"limit": 100})),
+    Scenario("books-by-genre", lambda c, ctx: c.get("/api/books", params={"genre": pick(ctx, "genres"), "limit": 100})),
+    Scenario("books-search", lambda c, ctx: c.get("/api/books", params={"search": pick(ctx, "words"), "limit": 50}),
+             mongod_only=True),
+    Scenario("users-page", lambda c, ctx: c.get("/api/users", params={"limit": 100})),
+    Scenario("user-history", lambda c, ctx: c.get("/api/transactions", params={"user_id": pick(ctx, "user_ids"), "limit": 100})),
+    Scenario("transactions-by-date", lambda c, ctx: c.get("/api/transactions", params={**pick(ctx, "date_ranges"), "limit": 100})),
+    Scenario("issue", issue),
+    Scenario("return", return_loan),
+    Scenario("dashboard", lambda c, ctx: c.get("/api/dashboard/stats")),
+    Scenario("top-borrowers", lambda c, ctx: c.get("/api/analytics/top-borrowers")),
+    Scenario("top-books", lambda c, ctx: c.get("/api/analytics/top-books")),
+    Scenario("genre-distribution", lambda c, ctx: c.get("/api/analytics/genre-distribution")),
+    Scenario("overdue-list", lambda c, ctx: c.get("/api/analytics/overdue-list", params={"limit": 100})),
+    Scenario("weekly-report", weekly_report, requests=3, concurrency=1),
+    Scenario("fine-simulation", lambda c, ctx: c.post("/api/fines/simulate", json={"policies": [
+        {"grace_period_days": 7, "tiers": [{"days_start": 1, "days_end": None, "rate_per_day": 5}]},
+    ]}), requests=3, concurrency=1),
+]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def run_scenario(client, scenario: Scenario, context: dict, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await scenario.request(client, context)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400 or (scenario.name == "weekly-report" and response.json()["status"] != "done"):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def build_context(server, description: dict) -> dict:
+    """IDs and parameters the scenarios draw from"""
+    db = server.db
+    as_of = date.fromisoformat(description["as_of"])
+    titles = await db.books.distinct("title")
+    return {
+        "user_ids": await db.users.distinct("user_id"),
+        "genres": await db.books.distinct("genre"),
+        "words": sorted({word for title in titles[:1000] for word in title.split() if not word.isdigit()}),
+        "available_books": await db.books.distinct("book_id", {"available_copies": {"$gt": 0}}),
+        "date_ranges": [
+            {"from": (as_of - timedelta(days=days + 7)).isoformat(), "to": (as_of - timedelta(days=days)).isoformat()}
+            for days in range(0, 700, 30)
+        ],
+        "issued": [],
+    }
+
+
+async def insert_dataset(server, dataset: Path):
+    """Load the CSVs into mongomock with plain inserts.
+
+    mongomock checks upsert keys and unique indexes by scanning the collection,
+    so the real import's per-row upserts are quadratic there; insert the rows
+    prepared the same way, then build the indexes once.
+    """
+    import pandas as pd
+
+    for collection, _, prepare in server.IMPORT_PLAN:
+        docs = prepare(pd.read_csv(dataset / f"{collection}.csv")).to_dict("records")
+        await server.db[collection].insert_many(docs)
+    await server.ensure_indexes()
+    await server.rebuild_dashboard_stats()
+
+
+async def benchmark(args, dataset: Path, description: dict) -> dict:
+    import httpx
+    import server
+
+    using_mongod = bool(args.mongo_url)
+    if not using_mongod:
+        from mongomock_motor import AsyncMongoMockClient
+
+        server.db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+
+    try:
+        started = time.perf_counter()
+        if using_mongod:
+            await server.ensure_indexes()
+            await server.import_initial_data(datasets.sources(dataset), force=True)
+        else:
+            await insert_dataset(server, dataset)
+        await server.sweep_accrued_fines()
+        if server.SNAPSHOT_REFRESH_INTERVAL > 0:
+            await server.refresh_snapshot(full=True)
+        import_seconds = time.perf_counter() - started
+        print(f"Loaded {description['transactions']} transactions in {import_seconds:.1f}s")
+
+        context = await build_context(server, description)
+        results = {}
+        # App exceptions come back as 500s and count as errors
+        transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for scenario in SCENARIOS:
+                if args.only and scenario.name not in args.only:
+                    continue
+                if scenario.mongod_only and not using_mongod:
+                    print(f"{scenario.name:<22} skipped (needs mongod)")
+                    continue
+                requests = scenario.requests or args.requests
+                if scenario.name == "return":
+                    requests = min(requests, len(context["issued"]))
+                    if not requests:
+                        continue
+                result = await run_scenario(
+                    client, scenario, context, requests, min(scenario.concurrency or args.concurrency, requests)
+                )
+                results[scenario.name] = result
+                print(f"{scenario.name:<22} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} "
+                      f"{result['throughput_rps']:>9} {result['peak_rss_mb']:>9} {result['errors']:>6}")
+    finally:
+        if using_mongod:
+            await server.client.drop_database(os.environ["DB_NAME"])
+
+    return {
+        "meta": {
+            "dataset": description,
+            "backend": "mongod" if using_mongod else "mongomock",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache_enabled": server.cache.enabled,
+            "snapshot": server.SNAPSHOT_REFRESH_INTERVAL > 0,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "import_seconds": round(import_seconds, 2),
+        "scenarios": results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose p95 grew by more than `tolerance` over the baseline"""
+    regressions = []
+    print(f"\n{'scenario':<22} {'p95 before':>10} {'p95 now':>9} {'change':>8}")
+    for name, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        change = result["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"{name:<22} {before['p95_ms']:>10} {result['p95_ms']:>9} {change:>+8.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="10k", help=f"Dataset to generate if missing: {', '.join(datasets.SIZES)} or a number")
+    parser.add_argument("--dataset", type=Path, help="Use an existing dataset directory instead")
+    parser.add_argument("--mongo-url", help="Benchmark against this mongod instead of mongomock")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--only", type=lambda value: set(value.split(",")), help="Comma-separated scenario names")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", type=Path, help="Write results to this file")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    dataset = args.dataset or datasets.DATA_DIR / args.size.lower()
+    if not (dataset / "dataset.json").exists():
+        print(f"Generating {dataset}")
+        datasets.generate(datasets.parse_size(args.size), dataset, seed=args.seed)
+    description = json.loads((dataset / "dataset.json").read_text())
+
+    scratch = tempfile.TemporaryDirectory()
+    os.environ.update({
+        "MONGO_URL": args.mongo_url or os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+        "DB_NAME": f"library_benchmark_{uuid.uuid4().hex[:8]}",
+        "REPORTS_DIR": str(Path(scratch.name) / "reports"),
+        "SNAPSHOT_DIR": str(Path(scratch.name) / "snapshot"),
+    })
+    os.environ.setdefault("CACHE_ENABLED", "0")
+    os.environ.setdefault("SNAPSHOT_REFRESH_SECONDS", "0")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    print(f"{'scenario':<22} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'req/s':>9} {'RSS (MB)':>9} {'errors':>6}")
+    with scratch:
+        results = asyncio.run(benchmark(args, dataset, description))
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.tolerance)
+        if regressions:
+            sys.exit(f"p95 regressions: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
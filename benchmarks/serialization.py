@@ -0,0 +1,140 @@
+"""Response serialization benchmark: FastAPI's default rendering vs FAST_RESPONSES.
+
+Loads a synthetic dataset (benchmarks/datasets.py) into an in-memory mongomock
+database, fetches one large page from each list and analytics endpoint, then
+times only the step from the rows the handler returns to response bytes:
+
+- default: FastAPI's serialize_response (response_model validation, or
+  jsonable_encoder for endpoints without one) followed by JSONResponse
+- fast: server.fast_response, i.e. a TypeAdapter validating and dumping in
+  pydantic-core for list rows, orjson for analytics rows
+
+Usage:
+    python benchmarks/serialization.py [--size 10k | --dataset DIR] [--repeat 20] [--json results.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import datasets
+from load import BACKEND_DIR, insert_dataset
+
+PAGE = 1000
+
+
+def endpoints(server):
+    """(name, route path, model, coroutine returning the handler's rows)"""
+    Response = server.Response
+    return [
+        ("books", "/api/books", server.Book, lambda: server.get_books(
+            Response(), genre=None, search=None, limit=PAGE, after=None, stream=False)),
+        ("users", "/api/users", server.User, lambda: server.get_users(
+            Response(), department=None, search=None, limit=PAGE, after=None, stream=False)),
+        ("transactions", "/api/transactions", server.Transaction, lambda: server.get_transactions(
+            Response(), status=None, user_id=None, date_from=None, date_to=None,
+            limit=PAGE, after=None, stream=False, include_archive=False)),
+        ("top-borrowers", "/api/analytics/top-borrowers", None, lambda: server.get_top_borrowers(Response(), PAGE)),
+        ("top-books", "/api/analytics/top-books", None, lambda: server.get_top_books(Response(), PAGE)),
+        ("genre-distribution", "/api/analytics/genre-distribution", None,
+         lambda: server.get_genre_distribution(Response())),
+        ("overdue-list", "/api/analytics/overdue-list", None, lambda: server.get_overdue_list(Response(), PAGE, None)),
+    ]
+
+
+async def best_of(repeat: int, render) -> float:
+    """Fastest of `repeat` runs, with the garbage collector off as timeit does"""
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await render()
+            timings.append(time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return min(timings)
+
+
+async def benchmark(dataset: Path, repeat: int) -> dict:
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+
+    server.db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+    await insert_dataset(server, dataset)
+    await server.sweep_accrued_fines()
+    routes = {route.path: route for route in server.app.routes if "GET" in getattr(route, "methods", ())}
+
+    results = {}
+    for name, path, model, fetch in endpoints(server):
+        server.FAST_RESPONSES = False
+        rows = await fetch()
+        field = routes[path].secure_cloned_response_field
+
+        async def default():
+            return JSONResponse(await serialize_response(field=field, response_content=rows)).body
+
+        async def fast():
+            return server.fast_response(rows, server.Response(), model).body
+
+        # Rows are fetched the default way; only rendering switches
+        server.FAST_RESPONSES = True
+        assert json.loads(await default()) == json.loads(await fast())
+        before = await best_of(repeat, default)
+        after = await best_of(repeat, fast)
+
+        per_row = max(len(rows), 1)
+        results[name] = {
+            "rows": len(rows),
+            "default_us_per_row": round(before / per_row * 1e6, 2),
+            "fast_us_per_row": round(after / per_row * 1e6, 2),
+            "speedup": round(before / after, 1) if after else None,
+        }
+        result = results[name]
+        print(f"{name:<20} {result['rows']:>6} {result['default_us_per_row']:>14} "
+              f"{result['fast_us_per_row']:>11} {result['speedup']:>8}x")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="10k", help=f"Dataset to generate if missing: {', '.join(datasets.SIZES)} or a number")
+    parser.add_argument("--dataset", type=Path, help="Use an existing dataset directory instead")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", type=Path, help="Write results to this file")
+    args = parser.parse_args()
+
+    dataset = args.dataset or datasets.DATA_DIR / args.size.lower()
+    if not (dataset / "dataset.json").exists():
+        print(f"Generating {dataset}")
+        datasets.generate(datasets.parse_size(args.size), dataset)
+
+    scratch = tempfile.TemporaryDirectory()
+    os.environ.update({
+        "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+        "DB_NAME": "library_serialization",
+        "SNAPSHOT_DIR": scratch.name,
+        "CACHE_ENABLED": "0",
+        "SNAPSHOT_REFRESH_SECONDS": "0",
+    })
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    print(f"{'endpoint':<20} {'rows':>6} {'default µs/row':>14} {'fast µs/row':>11} {'speedup':>9}")
+    with scratch:
+        results = asyncio.run(benchmark(dataset, args.repeat))
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Worker cold-start benchmark: time to import the app and baseline RSS.
+
+Each run imports `server` in a fresh interpreter, the way a uvicorn/gunicorn
+worker does on boot, and records wall-clock import time, peak RSS and which
+heavy modules got loaded. The `eager` variant also imports pandas, numpy and
+openpyxl, showing what a worker would pay if they were loaded up front.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl"]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import server
+{extra}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+VARIANTS = {
+    "lazy": "",
+    "eager": "import pandas, numpy, openpyxl",
+}
+
+
+def probe(variant: str) -> dict:
+    env = {
+        **os.environ,
+        "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+        "DB_NAME": os.environ.get("DB_NAME", "library_benchmark"),
+    }
+    code = PROBE.format(extra=VARIANTS[variant], heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    # Warm the OS page cache so the first run isn't dominated by disk reads
+    probe("eager")
+
+    results = {}
+    for variant in VARIANTS:
+        runs = [probe(variant) for _ in range(args.runs)]
+        results[variant] = {
+            "import_seconds_median": round(statistics.median(r["import_seconds"] for r in runs), 4),
+            "max_rss_mb_median": round(statistics.median(r["max_rss_mb"] for r in runs), 1),
+            "heavy_modules_loaded": runs[0]["heavy_modules_loaded"],
+        }
+
+    print(f"{'variant':<8} {'import (s)':>11} {'RSS (MB)':>9}  heavy modules")
+    for variant, result in results.items():
+        print(f"{variant:<8} {result['import_seconds_median']:>11} {result['max_rss_mb_median']:>9}  "
+              f"{', '.join(result['heavy_modules_loaded']) or '-'}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
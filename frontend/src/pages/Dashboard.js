@@ -8,10 +8,20 @@ const API = `${BACKEND_URL}/api`;
 
 const Dashboard = () => {
   const [stats, setStats] = useState(null);
+  const [finePolicy, setFinePolicy] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     fetchStats();
+    fetchFinePolicy();
+    // Live updates: a full snapshot on connect, then only the fields that changed
+    const source = new EventSource(`${API}/dashboard/stream`);
+    source.addEventListener('snapshot', (event) => setStats(JSON.parse(event.data)));
+    source.addEventListener('delta', (event) => {
+      const delta = JSON.parse(event.data);
+      setStats((current) => ({ ...current, ...delta }));
+    });
+    return () => source.close();
   }, []);
 
   const fetchStats = async () => {
@@ -25,6 +35,15 @@ const Dashboard = () => {
     }
   };
 
+  const fetchFinePolicy = async () => {
+    try {
+      const response = await axios.get(`${API}/fines/policy`);
+      setFinePolicy(response.data);
+    } catch (error) {
+      console.error('Error fetching fine policy:', error);
+    }
+  };
+
   if (loading) {
     return (
       <div className="flex items-center justify-center h-64">
@@ -117,11 +136,13 @@ const Dashboard = () => {
           </CardHeader>
           <CardContent className="space-y-3">
             <div className="bg-gradient-to-r from-teal-50 to-blue-50 p-4 rounded-lg border border-teal-200">
-              <p className="text-sm text-slate-600 mb-2"><strong>Grace Period:</strong> 5 days</p>
-              <div className="space-y-1.5 text-sm text-slate-600">
-                <p>• Days 1-7: ₹2 per day</p>
-                <p>• Days 8-14: ₹5 per day</p>
-                <p>• Days 15+: ₹10 per day</p>
+              <p className="text-sm text-slate-600 mb-2"><strong>Grace Period:</strong> {finePolicy?.grace_period_days ?? 5} days</p>
+              <div className="space-y-1.5 text-sm text-slate-600" data-testid="fine-policy-tiers">
+                {(finePolicy?.tiers || []).map((tier, index) => (
+                  <p key={index}>
+                    • Days {tier.days_start}{tier.days_end ? `-${tier.days_end}` : '+'}: ₹{tier.rate_per_day} per day
+                  </p>
+                ))}
               </div>
             </div>
           </CardContent>
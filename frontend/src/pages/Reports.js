@@ -7,35 +7,40 @@ import { FileText, Download, FileSpreadsheet } from 'lucide-react';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const REPORT_POLL_TIMEOUT_MS = 11 * 60 * 1000;
 
 const Reports = () => {
   const [generating, setGenerating] = useState(false);
 
+  const waitForReport = async (jobId) => {
+    // The server fails report jobs after 10 minutes; stop polling shortly after
+    const deadline = Date.now() + REPORT_POLL_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      const { data: job } = await axios.get(`${API}/reports/jobs/${jobId}`);
+      if (job.status === 'done') return job;
+      if (job.status === 'failed') throw new Error(job.error || 'Report generation failed');
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+    }
+    throw new Error('Timed out waiting for the report');
+  };
+
   const generateWeeklyReport = async () => {
     setGenerating(true);
     try {
-      const response = await axios.post(`${API}/reports/generate`);
-      
-      if (response.data.success) {
-        // Decode base64 and download
-        const base64 = response.data.content;
-        const binary = atob(base64);
-        const bytes = new Uint8Array(binary.length);
-        for (let i = 0; i < binary.length; i++) {
-          bytes[i] = binary.charCodeAt(i);
-        }
-        const blob = new Blob([bytes], { type: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' });
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = response.data.filename;
-        document.body.appendChild(a);
-        a.click();
-        window.URL.revokeObjectURL(url);
-        document.body.removeChild(a);
-        
-        toast.success('Weekly report generated successfully!');
-      }
+      const { data: started } = await axios.post(`${API}/reports/generate`);
+      const job = await waitForReport(started.job_id);
+
+      const response = await axios.get(`${API}/reports/jobs/${job.job_id}/download`, { responseType: 'blob' });
+      const url = window.URL.createObjectURL(response.data);
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = job.result.filename;
+      document.body.appendChild(a);
+      a.click();
+      window.URL.revokeObjectURL(url);
+      document.body.removeChild(a);
+
+      toast.success('Weekly report generated successfully!');
     } catch (error) {
       console.error('Error generating report:', error);
       toast.error('Failed to generate report');
@@ -0,0 +1,73 @@
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "library_test")
+os.environ.setdefault("CACHE_ENABLED", "0")
+os.environ.setdefault("SNAPSHOT_REFRESH_SECONDS", "0")
+
+import server  # noqa: E402
+
+# Set TEST_MONGO_URL to run the suite against a real mongod; otherwise an
+# in-memory mongomock database is used and mongod-only tests are skipped.
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+
+requires_mongod = pytest.mark.skipif(not TEST_MONGO_URL, reason="TEST_MONGO_URL not set")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db(monkeypatch):
+    if TEST_MONGO_URL:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(TEST_MONGO_URL)
+        database = client[f"library_test_{uuid.uuid4().hex[:8]}"]
+    else:
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        client = mongomock_motor.AsyncMongoMockClient()
+        database = client["library_test"]
+
+    monkeypatch.setattr(server, "db", database)
+    yield database
+
+    if TEST_MONGO_URL:
+        await client.drop_database(database.name)
+        client.close()
+
+
+@pytest.fixture
+async def library(db):
+    """A small catalog with a few open and returned loans"""
+    await server.ensure_indexes()
+    await db.books.insert_many([
+        {"book_id": f"B{i:03}", "title": f"Book {i}", "author": f"Author {i % 5}",
+         "genre": ["Fiction", "Science", "History"][i % 3],
+         "available_copies": 3, "total_copies": 3, "shelf_location": "A1"}
+        for i in range(30)
+    ])
+    await db.users.insert_many([
+        {"user_id": f"U{i:03}", "name": f"User {i}", "email": f"user{i}@campus.edu",
+         "phone": "9999999999", "department": ["Arts", "MBA"][i % 2], "semester": "1"}
+        for i in range(20)
+    ])
+    await db.transactions.insert_many([
+        {"transaction_id": f"T{i:04}", "book_id": f"B{i % 30:03}", "user_id": f"U{i % 20:03}",
+         "issue_date": datetime(2024, 1, 1), "due_date": datetime(2024, 1, i % 28 + 1),
+         "return_date": None if i % 3 == 0 else datetime(2024, 2, 1),
+         "status": "issued" if i % 3 == 0 else "returned", "fine_amount": 0.0}
+        for i in range(90)
+    ])
+    return db
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+
+import server
+from tests.conftest import requires_mongod
+
+pytestmark = pytest.mark.anyio
+
+
+async def user_history(user_id, include_archive, limit=4):
+    rows, after = [], None
+    while True:
+        response = Response()
+        rows += await server.get_transactions(
+            response, status=None, user_id=user_id, date_from=None, date_to=None,
+            limit=limit, after=after, stream=False, include_archive=include_archive
+        )
+        after = response.headers.get("X-Next-Cursor")
+        if not after:
+            return rows
+
+
+async def test_archive_moves_old_returned_loans(library):
+    returned = await library.transactions.count_documents({"status": "returned"})
+
+    result = await server.archive_transactions(older_than=timedelta(days=30), batch_size=7)
+
+    assert result == {"archived": returned, "months": ["2024-02"]}
+    assert await library.transactions.count_documents({"status": "returned"}) == 0
+    assert await library.transactions_archive_2024_02.count_documents({}) == returned
+    month = await library.archive_months.find_one({"_id": "2024-02"})
+    assert month["rolled_up"] and month["transactions"] == returned
+
+    # Nothing left to move
+    assert (await server.archive_transactions(older_than=timedelta(days=30)))["archived"] == 0
+
+
+async def test_recent_returns_stay_hot(library):
+    assert (await server.archive_transactions(older_than=timedelta(days=100 * 365)))["archived"] == 0
+
+
+async def test_dashboard_rebuild_counts_archived_loans(library):
+    before = await server.rebuild_dashboard_stats()
+    await server.archive_transactions(older_than=timedelta(days=30))
+    after = await server.rebuild_dashboard_stats()
+
+    for counter in ("total_transactions", "returned_loans", "total_fines", "total_borrow_days"):
+        assert after[counter] == before[counter]
+
+
+async def test_user_history_spans_hot_and_archive(library):
+    before = await user_history("U003", include_archive=False)
+    await server.archive_transactions(older_than=timedelta(days=30))
+
+    assert len(await user_history("U003", include_archive=False)) < len(before)
+    merged = await user_history("U003", include_archive=True)
+    assert [row["transaction_id"] for row in merged] == [row["transaction_id"] for row in before]
+
+
+async def test_include_archive_cannot_stream(library):
+    with pytest.raises(HTTPException) as error:
+        await server.get_transactions(
+            Response(), status=None, user_id="U001", date_from=None, date_to=None,
+            limit=None, after=None, stream=True, include_archive=True
+        )
+    assert error.value.status_code == 400
+
+
+async def test_interrupted_rollup_is_finished_next_run(library):
+    await server.archive_transactions(older_than=timedelta(days=30))
+    await library.transaction_rollups.delete_many({})
+    await library.archive_months.update_one({"_id": "2024-02"}, {"$set": {"rolled_up": False}})
+
+    assert (await server.archive_transactions(older_than=timedelta(days=30)))["months"] == ["2024-02"]
+    loans = sum([rollup["loan_count"] async for rollup in library.transaction_rollups.find()])
+    assert loans == await library.transactions_archive_2024_02.count_documents({})
+
+
+@requires_mongod
+async def test_analytics_include_archived_history(library):
+    before = await server.get_top_borrowers(Response(), 5)
+    await server.archive_transactions(older_than=timedelta(days=30))
+    assert await server.get_top_borrowers(Response(), 5) == before
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from cache import SingleFlight, TTLCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("b") == (False, None)
+    assert cache.get("c") == (True, 3)
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_by_key_and_prefix():
+    cache = TTLCache()
+    for key in ("analytics:top-books:10", "analytics:genre-distribution", "books:genres"):
+        cache.set(key, key)
+    cache.invalidate("books:genres", prefix="analytics:")
+    assert cache.stats()["entries"] == 0
+
+
+def test_disabled_cache_never_hits():
+    cache = TTLCache(enabled=False)
+    cache.set("a", 1)
+    assert cache.get("a") == (False, None)
+
+
+@pytest.mark.anyio
+async def test_document_misses_are_not_cached_and_do_not_invalidate(library, monkeypatch):
+    monkeypatch.setattr(server, "cache", TTLCache())
+    generation = server.cache.generation
+
+    assert await server.get_cached_book("NOPE") is None
+    assert server.cache.get("book:NOPE") == (False, None)
+    # A miss must not look like a write to loads running alongside it
+    assert server.cache.generation == generation
+
+    assert (await server.get_cached_book("B001"))["title"] == "Book 1"
+    assert server.cache.get("book:B001")[0]
+
+
+@pytest.mark.anyio
+async def test_write_during_slow_load_is_not_overwritten(monkeypatch):
+    monkeypatch.setattr(server, "cache", TTLCache())
+    monkeypatch.setattr(server, "flights", SingleFlight())
+    stored = {"version": 1}
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_load():
+        seen = dict(stored)
+        started.set()
+        await release.wait()
+        return seen
+
+    async def load():
+        return dict(stored)
+
+    pending = asyncio.create_task(server.load_shared("analytics:x", slow_load))
+    await started.wait()
+    # A write lands while the load that read the old value is still running
+    stored["version"] = 2
+    server.cache.invalidate(prefix="analytics:")
+
+    # Callers after the write start their own load rather than joining the stale one
+    assert await asyncio.wait_for(server.load_shared("analytics:x", load), 1) == {"version": 2}
+    release.set()
+    assert await pending == {"version": 1}
+    assert server.cache.get("analytics:x") == (True, {"version": 2})
+
+    cache = TTLCache()
+    pending = asyncio.create_task(cache.get_or_load("key", slow_load))
+    await asyncio.sleep(0)
+    cache.invalidate("key")
+    await pending
+    assert cache.get("key") == (False, None)
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_transaction_ids_are_unique_and_time_ordered():
+    ids = [server.new_transaction_id() for _ in range(1000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+async def test_concurrent_issues_never_oversell(library):
+    await library.books.update_one({"book_id": "B001"}, {"$set": {"available_copies": 25}})
+
+    requests = [
+        server.issue_book(server.TransactionCreate(book_id="B001", user_id=f"U{i % 20:03}"))
+        for i in range(300)
+    ]
+    results = await asyncio.gather(*requests, return_exceptions=True)
+
+    issued = [r["transaction_id"] for r in results if isinstance(r, dict)]
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(issued) == 25
+    assert len(set(issued)) == 25
+    assert len(rejected) == 275
+    assert all(r.status_code == 400 for r in rejected)
+
+    book = await library.books.find_one({"book_id": "B001"})
+    assert book["available_copies"] == 0
+    assert await library.transactions.count_documents({"transaction_id": {"$in": issued}}) == 25
+
+
+async def test_issue_to_unknown_user_releases_the_copy(library):
+    with pytest.raises(HTTPException) as exc:
+        await server.issue_book(server.TransactionCreate(book_id="B002", user_id="NOPE"))
+    assert exc.value.status_code == 404
+    book = await library.books.find_one({"book_id": "B002"})
+    assert book["available_copies"] == 3
+
+
+async def test_concurrent_returns_apply_once(library):
+    issued = await server.issue_book(server.TransactionCreate(book_id="B003", user_id="U001"))
+    return_data = server.TransactionReturn(transaction_id=issued["transaction_id"])
+
+    results = await asyncio.gather(
+        *[server.return_book(return_data) for _ in range(20)], return_exceptions=True
+    )
+
+    assert sum(isinstance(r, dict) for r in results) == 1
+    book = await library.books.find_one({"book_id": "B003"})
+    assert book["available_copies"] == 3
+
+
+async def test_bulk_issue_reports_per_item_results(library):
+    items = [server.TransactionCreate(book_id="B004", user_id="U001") for _ in range(5)]
+    items.append(server.TransactionCreate(book_id="MISSING", user_id="U001"))
+
+    response = await server.issue_books_bulk(server.BulkIssueRequest(items=items))
+
+    assert response["issued"] == 3
+    assert [r["status"] for r in response["results"]] == ["issued"] * 3 + ["error"] * 3
+    assert response["results"][-1]["detail"] == "Book not found"
+    book = await library.books.find_one({"book_id": "B004"})
+    assert book["available_copies"] == 0
+
+
+async def test_bulk_issue_releases_copies_of_failed_inserts(library, monkeypatch):
+    await library.transactions.insert_one({"transaction_id": "TTAKEN", "book_id": "B006", "user_id": "U001"})
+    ids = iter(["TNEW1", "TTAKEN", "TTAKEN"])
+    monkeypatch.setattr(server, "new_transaction_id", lambda: next(ids))
+
+    response = await server.issue_books_bulk(server.BulkIssueRequest(items=[
+        server.TransactionCreate(book_id="B006", user_id="U001"),
+        server.TransactionCreate(book_id="B006", user_id="U002"),
+        server.TransactionCreate(book_id="B007", user_id="U003"),
+    ]))
+
+    assert response["issued"] == 1 and response["failed"] == 2
+    assert [r["status"] for r in response["results"]] == ["issued", "error", "error"]
+    assert (await library.books.find_one({"book_id": "B006"}))["available_copies"] == 2
+    assert (await library.books.find_one({"book_id": "B007"}))["available_copies"] == 3
+
+
+async def test_bulk_return_restores_copies_once(library):
+    issued = await server.issue_books_bulk(server.BulkIssueRequest(items=[
+        server.TransactionCreate(book_id="B005", user_id="U002") for _ in range(2)
+    ]))
+    ids = [r["transaction_id"] for r in issued["results"]]
+    items = [server.TransactionReturn(transaction_id=t) for t in ids + ids[:1] + ["MISSING"]]
+
+    response = await server.return_books_bulk(server.BulkReturnRequest(items=items))
+
+    assert response["returned"] == 2
+    assert [r["status"] for r in response["results"]] == ["returned", "returned", "error", "error"]
+    book = await library.books.find_one({"book_id": "B005"})
+    assert book["available_copies"] == 3
+
+
+@pytest.mark.parametrize("existing", [True, False], ids=["existing", "missing"])
+async def test_dashboard_counters_match_a_rebuild(library, existing):
+    if existing:
+        await server.rebuild_dashboard_stats()
+    else:
+        # A database from before the counters existed has no stats document
+        assert await library.dashboard_stats.count_documents({}) == 0
+
+    await server.create_book(server.BookCreate(
+        book_id="B900", title="New", author="Someone", genre="Fiction", available_copies=2, total_copies=2
+    ))
+    await server.create_user(server.UserCreate(
+        user_id="U900", name="New", email="new@campus.edu", phone="1234567890"
+    ))
+    issued = await server.issue_book(server.TransactionCreate(book_id="B900", user_id="U900"))
+    await server.return_book(server.TransactionReturn(transaction_id=issued["transaction_id"]))
+    await server.return_book(server.TransactionReturn(transaction_id="T0003"))
+
+    counters = await library.dashboard_stats.find_one({"_id": server.DASHBOARD_STATS_ID}, {"_id": 0, "rebuilt_at": 0})
+    rebuilt = await server.rebuild_dashboard_stats()
+    rebuilt.pop("rebuilt_at")
+    rebuilt.pop("_id", None)
+    assert counters == pytest.approx(rebuilt)
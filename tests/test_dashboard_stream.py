@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+
+import events
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def parse(message: bytes):
+    fields = dict(line.split(": ", 1) for line in message.decode().strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+
+@pytest.fixture
+async def feed(library, monkeypatch):
+    monkeypatch.setattr(server, "DASHBOARD_STREAM_DEBOUNCE", 0.2)
+    await server.rebuild_dashboard_stats()
+    computations = []
+    compute = server.live_dashboard_state
+
+    async def counted():
+        computations.append(1)
+        return await compute()
+
+    monkeypatch.setattr(server, "live_dashboard_state", counted)
+    monkeypatch.setattr(server, "dashboard_feed", server.DashboardFeed())
+    yield computations
+    server.dashboard_feed.close()
+    await asyncio.sleep(0)
+
+
+async def test_clients_share_one_debounced_update(feed):
+    clients = await asyncio.gather(*[server.dashboard_feed.subscribe() for _ in range(50)])
+    snapshots = [client.get_nowait() for client in clients]
+    event, state = parse(snapshots[0])
+    assert event == "snapshot" and state["active_loans"] == 30
+    assert len(feed) == 1
+
+    await asyncio.gather(*[
+        server.issue_book(server.TransactionCreate(book_id=f"B00{i}", user_id="U001")) for i in range(5)
+    ])
+    deltas = await asyncio.gather(*[asyncio.wait_for(client.get(), 1) for client in clients])
+
+    # One recomputation for the burst, one encoded message for every client
+    assert len(feed) == 2
+    assert all(delta is deltas[0] for delta in deltas)
+    event, delta = parse(deltas[0])
+    assert event == "delta"
+    assert delta["active_loans"] == 35 and delta["total_transactions"] == 95
+    assert "total_books" not in delta
+
+
+async def test_catalog_writes_are_pushed(feed):
+    client = await server.dashboard_feed.subscribe()
+    client.get_nowait()
+
+    await server.create_user(server.UserCreate(user_id="U999", name="New", email="new@campus.edu", phone="1"))
+    _, delta = parse(await asyncio.wait_for(client.get(), 1))
+    assert delta == {"total_users": 21}
+
+
+async def test_stream_endpoint_starts_with_snapshot(feed):
+    response = await server.stream_dashboard()
+    assert response.media_type == "text/event-stream"
+
+    event, state = parse(await response.body_iterator.__anext__())
+    assert event == "snapshot"
+    assert [book["book_id"] for book in state["top_books"]] == [
+        row["book_id"] for row in await server.get_top_books(server.Response(), server.DASHBOARD_TOP_BOOKS)
+    ]
+    await response.body_iterator.aclose()
+    assert len(server.dashboard_feed.clients) == 0
+
+
+@pytest.mark.parametrize("from_snapshot", [False, True], ids=["live", "snapshot"])
+async def test_top_books_follow_new_loans_unless_read_from_snapshot(library, tmp_path, monkeypatch, from_snapshot):
+    monkeypatch.setattr(server, "SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr(server, "SNAPSHOT_REFRESH_INTERVAL", 600)
+    monkeypatch.setattr(server, "DASHBOARD_TOP_BOOKS_FROM_SNAPSHOT", from_snapshot)
+    await server.refresh_snapshot()
+
+    await library.books.update_one({"book_id": "B029"}, {"$set": {"available_copies": 10}})
+    for i in range(4):
+        await server.issue_book(server.TransactionCreate(book_id="B029", user_id=f"U{i:03}"))
+
+    top = (await server.live_dashboard_state())["top_books"][0]
+    assert (top["book_id"] == "B029") is not from_snapshot
+
+
+async def test_slow_client_is_resynced():
+    fanout = events.Fanout(maxsize=2)
+    slow = fanout.add()
+    for seq in range(5):
+        fanout.send(f"delta {seq}".encode(), resync=f"full {seq}".encode())
+    assert events.drain(slow) == [b"full 4"]
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def test_to_utc_normalizes_offsets():
+    assert server.to_utc("2024-01-01T05:30:00+05:30") == datetime(2024, 1, 1)
+    assert server.to_utc("2024-01-01T00:00:00Z") == datetime(2024, 1, 1)
+    assert server.to_utc("2024-01-01") == datetime(2024, 1, 1)
+    assert server.to_utc("") is None
+    assert server.to_utc(float("nan")) is None
+
+
+def test_transaction_model_serializes_iso_utc():
+    trans = server.Transaction(
+        transaction_id="T1", book_id="B1", user_id="U1", status="issued",
+        issue_date=datetime(2024, 1, 1, 9, 30), due_date="2024-01-08T15:00:00+05:30"
+    )
+    assert trans.model_dump(mode="json")["issue_date"] == "2024-01-01T09:30:00+00:00"
+    assert trans.model_dump(mode="json")["due_date"] == "2024-01-08T09:30:00+00:00"
+    assert trans.model_dump(mode="json")["return_date"] is None
+
+
+def test_batch_fines_match_scalar_across_date_types():
+    due = ["2024-01-01T00:00:00+00:00", datetime(2024, 1, 1), "2024-01-01T05:30:00+05:30", "2024-01-01"]
+    returned = [datetime(2024, 2, 1), "2024-02-01T00:00:00Z", "2024-02-01", None]
+    now = datetime(2024, 3, 1)
+    fines = server.calculate_fines_batch(due, returned, now=now)
+    assert list(fines[:3]) == [server.calculate_fine(d, r) for d, r in zip(due[:3], returned[:3])]
+    # Open loans are priced against `now`
+    assert fines[3] == server.calculate_fine(due[3], now)
+
+
+def test_batch_fines_match_scalar_for_every_overdue_day():
+    tiers = [
+        {"days_start": 1, "days_end": 7, "rate_per_day": 0.125},
+        {"days_start": 8, "days_end": 14, "rate_per_day": 1.005},
+        {"days_start": 15, "days_end": None, "rate_per_day": 2.675},
+    ]
+    due = datetime(2024, 1, 1)
+    returned = [due + timedelta(days=days, hours=days % 24) for days in range(401)]
+    for grace_period in (0, 5):
+        fines = server.calculate_fines_batch([due] * len(returned), returned, grace_period, tiers=tiers)
+        assert list(fines) == [server.calculate_fine(due, r, grace_period, tiers) for r in returned]
+
+
+async def test_migration_converts_string_dates(db):
+    await db.transactions.insert_many([
+        {"transaction_id": "T1", "issue_date": "2024-01-01T10:00:00+05:30",
+         "due_date": "2024-01-08T10:00:00+05:30", "return_date": None, "status": "issued"},
+        {"transaction_id": "T2", "issue_date": "2024-01-01", "due_date": "2024-01-08",
+         "return_date": "2024-01-20", "status": "returned"},
+        {"transaction_id": "T3", "issue_date": datetime(2024, 1, 1), "due_date": datetime(2024, 1, 8),
+         "return_date": "", "status": "issued"},
+    ])
+
+    assert await server.migrate_transaction_dates(batch_size=2) == 3
+    assert await server.migrate_transaction_dates(batch_size=2) == 0
+
+    docs = {doc["transaction_id"]: doc async for doc in db.transactions.find({}, {"_id": 0})}
+    assert docs["T1"]["issue_date"] == datetime(2024, 1, 1, 4, 30)
+    assert docs["T1"]["return_date"] is None
+    assert docs["T2"]["return_date"] == datetime(2024, 1, 20)
+    assert docs["T3"]["return_date"] is None
+    assert all(
+        isinstance(doc[field], datetime) for doc in docs.values() for field in ("issue_date", "due_date")
+    )
+
+
+async def test_transactions_date_range_pages_in_issue_order(library):
+    await library.transactions.update_many({}, [{"$set": {"issue_date": "$due_date"}}])
+
+    rows, after = [], None
+    while True:
+        response = Response()
+        page = await server.get_transactions(
+            response, date_from=datetime(2024, 1, 5), date_to=datetime(2024, 1, 10), limit=7, after=after,
+            stream=False
+        )
+        rows += page
+        after = response.headers.get("X-Next-Cursor")
+        if not after:
+            break
+
+    keys = [(row["issue_date"], row["transaction_id"]) for row in rows]
+    assert keys == sorted(keys)
+    assert len(keys) == len(set(keys))
+    assert all(datetime(2024, 1, 5) <= issued < datetime(2024, 1, 10) for issued, _ in keys)
+    assert len(rows) == await library.transactions.count_documents(
+        {"due_date": {"$gte": datetime(2024, 1, 5), "$lt": datetime(2024, 1, 10)}}
+    )
+
+
+async def test_overdue_list_pages_most_overdue_first(library):
+    await server.sweep_accrued_fines()
+
+    rows, cursor = [], None
+    while True:
+        response = Response()
+        page = await server.get_overdue_list(response, limit=4, cursor=cursor)
+        assert len(page) <= 4
+        rows += page
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    # Several loans share a due date, so the transaction ID breaks ties
+    keys = [(-row["overdue_days"], row["due_date"], row["transaction_id"]) for row in rows]
+    assert keys == sorted(keys)
+    ids = [row["transaction_id"] for row in rows]
+    assert len(ids) == len(set(ids))
+    overdue = library.transactions.find({"status": "issued", "due_date": {"$lt": server.utc_now()}})
+    assert sorted(ids) == sorted([loan["transaction_id"] async for loan in overdue])
+
+    row = next(row for row in rows if row["transaction_id"] == "T0003")
+    assert (row["book_id"], row["book_title"]) == ("B003", "Book 3")
+    assert (row["user_id"], row["user_name"], row["user_email"]) == ("U003", "User 3", "user3@campus.edu")
+    assert row["due_date"] == server.iso_utc(datetime(2024, 1, 4))
+
+
+async def test_cursor_must_match_sort_key(library):
+    cursor = server.encode_cursor(["T0001"])
+    with pytest.raises(HTTPException) as error:
+        await server.get_transactions(
+            Response(), date_from=datetime(2024, 1, 1), date_to=None, limit=10, after=cursor, stream=False
+        )
+    assert error.value.status_code == 400
+
+
+async def test_issue_and_return_store_native_dates(library):
+    issued = await server.issue_book(server.TransactionCreate(book_id="B001", user_id="U001", borrow_days=7))
+    trans = await library.transactions.find_one({"transaction_id": issued["transaction_id"]})
+    assert trans["due_date"] - trans["issue_date"] == timedelta(days=7)
+
+    await server.return_book(server.TransactionReturn(transaction_id=issued["transaction_id"]))
+    trans = await library.transactions.find_one({"transaction_id": issued["transaction_id"]})
+    assert isinstance(trans["return_date"], datetime)
+
+
+@pytest.mark.parametrize("bulk", [False, True], ids=["single", "bulk"])
+async def test_return_of_unmigrated_string_dated_loan(library, bulk):
+    # Written by an older version and not yet converted by migrate-dates
+    await library.transactions.update_one({"transaction_id": "T0003"}, {"$set": {
+        "issue_date": "2024-01-01T00:00:00+00:00", "due_date": "2024-01-04T05:30:00+05:30"
+    }})
+    if bulk:
+        result = await server.return_books_bulk(server.BulkReturnRequest(
+            items=[server.TransactionReturn(transaction_id="T0003")]
+        ))
+        assert result["results"][0]["status"] == "returned"
+    else:
+        await server.return_book(server.TransactionReturn(transaction_id="T0003"))
+
+    trans = await library.transactions.find_one({"transaction_id": "T0003"})
+    assert trans["overdue_days"] == (trans["return_date"] - datetime(2024, 1, 4)).days
+    assert trans["fine_amount"] == server.calculate_fine(datetime(2024, 1, 4), trans["return_date"])
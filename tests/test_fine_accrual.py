@@ -0,0 +1,53 @@
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_sweep_materializes_accrued_fines(library):
+    open_loans = await library.transactions.count_documents({"status": "issued"})
+    assert await server.sweep_accrued_fines(batch_size=7) == open_loans
+
+    now = server.utc_now()
+    async for loan in library.transactions.find({"status": "issued"}):
+        assert loan["accrued_fine"] == server.calculate_fine(loan["due_date"], now)
+        assert loan["overdue_days"] == (now - loan["due_date"]).days
+        assert loan["next_accrual_at"] > now
+
+    # Nothing has crossed into a new overdue day since
+    assert await server.sweep_accrued_fines() == 0
+
+
+async def test_dashboard_total_includes_accrued_fines(library):
+    await server.rebuild_dashboard_stats()
+    before = (await server.compute_dashboard_stats())["total_fines"]
+    await server.sweep_accrued_fines()
+
+    accrued = sum([loan["accrued_fine"] async for loan in library.transactions.find({"status": "issued"})])
+    assert accrued > 0
+    assert (await server.compute_dashboard_stats())["total_fines"] == round(before + accrued, 2)
+
+
+async def test_return_moves_accrued_fine_to_collected(library):
+    await server.rebuild_dashboard_stats()
+    await server.sweep_accrued_fines()
+    before = await server.compute_dashboard_stats()
+
+    await server.return_book(server.TransactionReturn(transaction_id="T0003"))
+    loan = await library.transactions.find_one({"transaction_id": "T0003"})
+    assert loan["accrued_fine"] == 0.0
+    assert loan["next_accrual_at"] is None
+
+    after = await server.compute_dashboard_stats()
+    # The fine charged is what had accrued, so the total does not move
+    assert after["total_fines"] == pytest.approx(before["total_fines"])
+
+
+async def test_overdue_list_reads_stored_fines(library):
+    await server.sweep_accrued_fines()
+    await library.transactions.update_one({"transaction_id": "T0000"}, {"$set": {"accrued_fine": 123.0}})
+
+    rows, _ = await server.fetch_overdue_page()
+    row = next(row for row in rows if row["transaction_id"] == "T0000")
+    assert row["fine_amount"] == 123.0
@@ -0,0 +1,109 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import Response
+from pydantic import ValidationError
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+STEEP = server.FinePolicyCreate(
+    grace_period_days=2,
+    tiers=[
+        {"days_start": 1, "days_end": 3, "rate_per_day": 1},
+        {"days_start": 4, "days_end": None, "rate_per_day": 20},
+    ],
+    note="steep",
+)
+AS_OF = datetime(2024, 3, 1)
+
+
+def expected_totals(loans, books, users, policy):
+    """Brute-force re-pricing with calculate_fine, one loan at a time"""
+    totals = {"total": 0.0, "department": {}, "genre": {}}
+    for loan in loans:
+        fine = server.calculate_fine(
+            loan["due_date"], loan["return_date"] or AS_OF, policy["grace_period_days"], policy["tiers"]
+        )
+        totals["total"] += fine
+        for field, label in (("department", users[loan["user_id"]]), ("genre", books[loan["book_id"]])):
+            totals[field][label] = totals[field].get(label, 0.0) + fine
+    return totals
+
+
+async def test_saved_policy_prices_returns_and_accruals(library):
+    assert (await server.get_fine_policy())["version"] == 0
+    await server.sweep_accrued_fines()
+
+    assert (await server.create_fine_policy(STEEP))["version"] == 1
+    assert (await server.create_fine_policy(STEEP))["version"] == 2
+    assert [policy["version"] for policy in await server.get_fine_policies()] == [2, 1]
+    tiers = STEEP.model_dump()["tiers"]
+
+    # Every open loan is re-accrued under the new policy
+    open_loans = await library.transactions.count_documents({"status": "issued"})
+    assert await server.sweep_accrued_fines() == open_loans
+    now = server.utc_now()
+    async for loan in library.transactions.find({"status": "issued"}):
+        assert loan["accrued_fine"] == server.calculate_fine(loan["due_date"], now, 2, tiers)
+
+    loan = await library.transactions.find_one({"transaction_id": "T0003"})
+    returned = await server.return_book(server.TransactionReturn(transaction_id="T0003"))
+    assert returned["fine_amount"] == server.calculate_fine(loan["due_date"], server.utc_now(), 2, tiers)
+
+
+@pytest.mark.parametrize("tiers", [
+    [{"days_start": 1, "days_end": 7, "rate_per_day": 2}, {"days_start": 5, "days_end": None, "rate_per_day": 5}],
+    [{"days_start": 1, "days_end": None, "rate_per_day": 2}, {"days_start": 8, "days_end": 14, "rate_per_day": 5}],
+    [{"days_start": 3, "days_end": 2, "rate_per_day": 2}],
+])
+def test_policy_tiers_are_validated(tiers):
+    with pytest.raises(ValidationError):
+        server.FinePolicyCreate(tiers=tiers)
+
+
+@pytest.mark.parametrize("use_snapshot", [False, True])
+async def test_simulation_reprices_full_history(library, tmp_path, monkeypatch, use_snapshot):
+    loans = await library.transactions.find({}, {"_id": 0}).to_list(None)
+    books = {book["book_id"]: book["genre"] async for book in library.books.find()}
+    users = {user["user_id"]: user["department"] async for user in library.users.find()}
+    # Returned loans move to the archive; the simulation still covers them
+    assert (await server.archive_transactions(older_than=timedelta(days=30)))["archived"] == 60
+    if use_snapshot:
+        monkeypatch.setattr(server, "SNAPSHOT_DIR", tmp_path)
+        monkeypatch.setattr(server, "SNAPSHOT_REFRESH_INTERVAL", 600)
+        await server.refresh_snapshot()
+    monkeypatch.setattr(server, "FINE_SIMULATION_BATCH_SIZE", 16)
+
+    response = Response()
+    result = await server.simulate_fines(server.FineSimulationRequest(policies=[STEEP], as_of=AS_OF), response)
+    assert ("X-Snapshot-At" in response.headers) == use_snapshot
+    assert result["transactions"] == 90
+
+    current, steep = result["policies"]
+    assert current["policy"]["version"] == 0
+    assert steep["policy"]["note"] == "steep"
+    for simulated, policy in ((current, server.FINE_CONFIG), (steep, STEEP.model_dump())):
+        expected = expected_totals(loans, books, users, policy)
+        assert simulated["total_fines"] == pytest.approx(expected["total"])
+        for field in ("department", "genre"):
+            assert {row[field]: row["total_fines"] for row in simulated[f"by_{field}"]} == pytest.approx(expected[field])
+    assert steep["change"] == pytest.approx(steep["total_fines"] - current["total_fines"])
+    assert sum(row["loans"] for row in current["by_genre"]) == 90
+
+
+async def test_simulation_prices_batches_off_the_event_loop(library, monkeypatch):
+    threads = []
+    add_documents = server.FineSimulation.add_documents
+
+    def recording(self, *args):
+        threads.append(threading.get_ident())
+        return add_documents(self, *args)
+
+    monkeypatch.setattr(server.FineSimulation, "add_documents", recording)
+    monkeypatch.setattr(server, "FINE_SIMULATION_BATCH_SIZE", 16)
+    result = await server.simulate_fines(server.FineSimulationRequest(policies=[STEEP], as_of=AS_OF), Response())
+    assert result["transactions"] == 90
+    assert threads and threading.get_ident() not in threads
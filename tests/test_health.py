@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+
+import jobs
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def ready_indexes(monkeypatch):
+    monkeypatch.setitem(server.readiness, "indexes", True)
+
+
+async def test_only_one_import_runs(db, monkeypatch):
+    running, release = [], asyncio.Event()
+
+    async def slow_import(**options):
+        running.append(1)
+        await release.wait()
+        return {}
+
+    monkeypatch.setattr(server, "import_initial_data", slow_import)
+    first = await server.initialize_data()
+    # Again on the same worker, then from another one
+    again = await server.initialize_data()
+    worker_id = server.WORKER_ID
+    monkeypatch.setattr(server, "WORKER_ID", "other-worker")
+    monkeypatch.setitem(server.running_import, "job_id", None)
+    elsewhere = await server.initialize_data()
+    monkeypatch.setattr(server, "WORKER_ID", worker_id)
+    monkeypatch.setitem(server.running_import, "job_id", first["job_id"])
+    await asyncio.sleep(0.01)
+
+    assert first["job_id"] and again["job_id"] == first["job_id"] == elsewhere["job_id"]
+    assert len(running) == 1
+
+    release.set()
+    for _ in range(100):
+        if (await jobs.get_job(db, first["job_id"]))["status"] == "done":
+            break
+        await asyncio.sleep(0.01)
+    assert await jobs.lease_holder(db, server.IMPORT_LEASE) is None
+    assert len(running) == 1
+
+
+async def test_not_ready_while_import_lease_is_held(db, ready_indexes):
+    assert await jobs.take_lease(db, server.IMPORT_LEASE, "other-worker", server.IMPORT_LEASE_TTL)
+    response = Response()
+    body = await server.health_ready(response)
+    assert response.status_code == 503
+    assert body["checks"]["data"] is False
+
+    await jobs.release_lease(db, server.IMPORT_LEASE, "other-worker")
+    response = Response()
+    assert (await server.health_ready(response))["status"] == "ready"
+    assert response.status_code == 200
+
+
+async def test_failed_index_is_reported(db):
+    await db.transactions.insert_many([{"transaction_id": "T1"}, {"transaction_id": "T1"}])
+    failed = await server.ensure_indexes()
+    assert any(index.startswith("transactions:") for index in failed)
+
+    await db.transactions.delete_one({"transaction_id": "T1"})
+    assert await server.ensure_indexes() == []
+
+
+async def test_repair_renames_duplicate_transaction_ids(db):
+    await db.transactions.insert_many([
+        {"transaction_id": "T1", "book_id": "B1"},
+        {"transaction_id": "T1", "book_id": "B2"},
+        {"transaction_id": "T1", "book_id": "B3"},
+        {"transaction_id": "T2", "book_id": "B4"},
+    ])
+    assert await server.ensure_indexes() != []
+
+    assert await server.repair_duplicate_transaction_ids() == 2
+    loans = {loan["book_id"]: loan["transaction_id"] async for loan in db.transactions.find()}
+    assert loans["B1"] == "T1" and loans["B4"] == "T2"
+    assert len(set(loans.values())) == 4
+    assert await server.ensure_indexes() == []
+
+
+async def test_failed_import_does_not_block_readiness(db, ready_indexes):
+    await db.import_checkpoints.insert_one({"_id": "transactions", "completed": False, "rows_done": 500})
+    response = Response()
+    body = await server.health_ready(response)
+    assert response.status_code == 200
+    assert body["import_interrupted"] is True
+
+
+async def test_setup_survives_unreachable_database(db, monkeypatch):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    unreachable = AsyncIOMotorClient("mongodb://127.0.0.1:1", serverSelectionTimeoutMS=50)
+    monkeypatch.setattr(server, "db", unreachable["library_test"])
+    monkeypatch.setitem(server.readiness, "indexes", False)
+    assert await server.prepare_database() is False
+    response = Response()
+    body = await server.health_ready(response)
+    assert response.status_code == 503
+    assert body["checks"] == {"indexes": False, "database": False, "data": False}
+    unreachable.close()
+
+    # The next attempt, once MongoDB is back, completes setup
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "import_initial_data", lambda **options: asyncio.sleep(0, {}))
+    assert await server.prepare_database() is True
+    assert server.readiness["indexes"] is True
+    for _ in range(100):
+        if await jobs.lease_holder(db, server.IMPORT_LEASE) is None:
+            break
+        await asyncio.sleep(0.01)
+    assert (await server.health_ready(Response()))["status"] == "ready"
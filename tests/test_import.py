@@ -0,0 +1,63 @@
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+from fastapi import Response
+
+import server
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+import datasets  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_synthetic_dataset_imports(db, tmp_path):
+    description = datasets.generate(300, tmp_path, as_of=date(2025, 1, 31))
+
+    imported = await server.import_initial_data(datasets.sources(tmp_path))
+
+    assert imported == {
+        "books": description["books"], "users": description["users"], "transactions": 300
+    }
+    assert await db.transactions.count_documents({"status": "issued"}) == description["open_loans"]
+    # CSV numbers come back as the strings the models expect
+    users = await server.get_users(Response(), department=None, search=None, limit=5, after=None, stream=False)
+    assert all(isinstance(user["semester"], str) for user in users)
+
+
+def write_users_csv(path, count):
+    rows = [f"U{i:03},User {i},user{i}@campus.edu,99999,MBA,{i % 8 + 1}" for i in range(count)]
+    path.write_text("user_id,name,email,phone,department,semester\n" + "\n".join(rows) + "\n")
+
+
+async def test_interrupted_import_resumes_without_rewriting_rows(db, tmp_path):
+    source = tmp_path / "users.csv"
+    write_users_csv(source, 25)
+    prepared = []
+
+    def prepare(chunk):
+        prepared.extend(chunk["user_id"])
+        return server.prepare_users(chunk)
+
+    async def crash_after_first_chunk(collection, rows_done):
+        raise RuntimeError("worker died")
+
+    with pytest.raises(RuntimeError):
+        await server.import_collection("users", str(source), "user_id", prepare, chunk_size=10,
+                                       progress=crash_after_first_chunk)
+    assert (await db.import_checkpoints.find_one({"_id": "users"}))["rows_done"] == 10
+
+    # The resumed load skips the checkpointed rows, so every row is prepared and written once
+    assert await server.import_collection("users", str(source), "user_id", prepare, chunk_size=10) == 15
+    assert prepared == [f"U{i:03}" for i in range(25)]
+    assert await db.users.count_documents({}) == 25
+    # Semesters read from the CSV as numbers are stored as the strings User expects
+    assert all(isinstance(user["semester"], str) for user in await db.users.find().to_list(None))
+
+    # Completed: the same source is not loaded again unless forced
+    assert await server.import_collection("users", str(source), "user_id", prepare, chunk_size=10) == 0
+    assert await server.import_collection("users", str(source), "user_id", prepare, chunk_size=10,
+                                          force=True) == 25
+    assert await db.users.count_documents({}) == 25
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from tests.conftest import requires_mongod
+
+pytestmark = pytest.mark.anyio
+
+
+def _plan_stages(plan):
+    """Every stage name in an explain() winning plan"""
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+async def test_ensure_indexes_is_idempotent(library):
+    await server.ensure_indexes()
+    info = await library.transactions.index_information()
+    assert any(spec["key"] == [("transaction_id", 1)] and spec.get("unique") for spec in info.values())
+
+
+async def test_create_book_duplicate_id_is_rejected(library):
+    book = server.BookCreate(book_id="B001", title="Dup", author="A", genre="Fiction",
+                             available_copies=1, total_copies=1)
+    with pytest.raises(HTTPException) as exc:
+        await server.create_book(book)
+    assert exc.value.status_code == 400
+
+
+async def test_update_book_to_existing_id_is_rejected(library):
+    book = server.BookCreate(book_id="B002", title="Renamed", author="A", genre="Fiction",
+                             available_copies=1, total_copies=1)
+    with pytest.raises(HTTPException) as exc:
+        await server.update_book("B001", book)
+    assert exc.value.status_code == 400
+    assert (await library.books.find_one({"book_id": "B001"}))["title"] == "Book 1"
+
+
+async def test_create_user_duplicate_id_is_rejected(library):
+    user = server.UserCreate(user_id="U001", name="Dup", email="d@campus.edu", phone="1")
+    with pytest.raises(HTTPException) as exc:
+        await server.create_user(user)
+    assert exc.value.status_code == 400
+
+
+@requires_mongod
+@pytest.mark.parametrize("collection, query, sort", [
+    ("books", {"book_id": "B001"}, None),
+    ("users", {"user_id": "U001"}, None),
+    ("transactions", {"transaction_id": "T0001"}, None),
+    ("transactions", {"user_id": "U001", "status": "issued"}, None),
+    ("transactions", {"status": "issued", "due_date": {"$lt": datetime(2024, 1, 15)}}, [("due_date", 1)]),
+    ("transactions", {"issue_date": {"$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 2, 1)}},
+     [("issue_date", 1), ("transaction_id", 1)]),
+    ("books", {"$text": {"$search": "Author"}}, None),
+    ("users", {"$text": {"$search": "User"}}, None),
+])
+async def test_hot_queries_do_not_collection_scan(library, collection, query, sort):
+    cursor = library[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+    stages = _plan_stages(plan)
+    assert "COLLSCAN" not in stages
+    assert "SORT" not in stages
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import Response
+
+import metrics
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1))
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 2' in lines
+    assert 'latency_seconds_count{route="/a"} 2' in lines
+
+
+def test_label_values_are_escaped():
+    registry = metrics.Registry()
+    registry.counter("hits_total", "Hits", ["path"]).inc(path='a"b\\c')
+    assert 'hits_total{path="a\\"b\\\\c"} 1' in registry.render()
+
+
+def test_command_timer_labels_by_collection_and_operation():
+    registry = metrics.Registry()
+    durations = registry.histogram("commands", "Commands", ["collection", "operation"])
+    failures = registry.counter("failures", "Failures", ["collection", "operation"])
+    timer = metrics.CommandTimer(durations, failures)
+
+    def event(name, command, request_id):
+        return SimpleNamespace(command_name=name, command=command, request_id=request_id,
+                               connection_id=("localhost", 27017), duration_micros=1500)
+
+    timer.started(event("aggregate", {"aggregate": "transactions"}, 1))
+    timer.succeeded(event("aggregate", None, 1))
+    timer.started(event("getMore", {"getMore": 42, "collection": "transactions"}, 2))
+    timer.failed(event("getMore", None, 2))
+
+    assert durations.count(collection="transactions", operation="aggregate") == 1
+    assert durations.count(collection="transactions", operation="getMore") == 1
+    assert failures.value(collection="transactions", operation="getMore") == 1
+
+
+async def test_requests_are_timed_by_route_template(library):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        labels = {"method": "GET", "route": "/api/reports/jobs/{job_id}", "status": "404"}
+        before = server.REQUEST_LATENCY.count(**labels)
+        assert (await http.get("/api/reports/jobs/first")).status_code == 404
+        assert (await http.get("/api/reports/jobs/second")).status_code == 404
+
+        body = (await http.get("/metrics")).text
+
+    assert server.REQUEST_LATENCY.count(**labels) == before + 2
+    assert 'http_requests_in_flight{method="GET",route="/api/reports/jobs/{job_id}"} 0' in body
+    assert "/api/reports/jobs/first" not in body
+
+
+async def test_analytics_count_scanned_and_returned(library):
+    labels = {"endpoint": "top-books", "source": "mongo"}
+    scanned = server.ANALYTICS_SCANNED.value(**labels)
+    returned = server.ANALYTICS_RETURNED.value(**labels)
+
+    rows = await server.get_top_books(Response(), 5)
+
+    assert server.ANALYTICS_SCANNED.value(**labels) == scanned + 90
+    assert server.ANALYTICS_RETURNED.value(**labels) == returned + len(rows)
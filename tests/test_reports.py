@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import openpyxl
+import pytest
+from fastapi import HTTPException
+
+import jobs
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_for_job(job_id):
+    for _ in range(200):
+        job = await jobs.get_job(server.db, job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+async def test_report_downloads_only_on_the_host_that_wrote_it(library, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "REPORTS_DIR", tmp_path)
+    started = await server.generate_weekly_report()
+    job = await wait_for_job(started["job_id"])
+    assert job["status"] == "done"
+
+    response = await server.download_report(job["_id"])
+    assert response.path == tmp_path / f"{job['_id']}.xlsx"
+
+    # Another host without a shared REPORTS_DIR cannot serve it
+    monkeypatch.setattr(server, "REPORTS_DIR", tmp_path / "elsewhere")
+    monkeypatch.setattr(server.socket, "gethostname", lambda: "other-host")
+    with pytest.raises(HTTPException) as error:
+        await server.download_report(job["_id"])
+    assert error.value.status_code == 421
+
+
+async def test_report_fine_total_includes_accrued_fines(library, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "REPORTS_DIR", tmp_path)
+    await library.transactions.update_one({"transaction_id": "T0001"}, {"$set": {"fine_amount": 10.0}})
+    await library.transactions.update_one({"transaction_id": "T0000"}, {"$set": {"accrued_fine": 4.5}})
+    started = await server.generate_weekly_report()
+    job = await wait_for_job(started["job_id"])
+
+    workbook = openpyxl.load_workbook(tmp_path / f"{job['_id']}.xlsx", read_only=True)
+    summary = dict(workbook["Fine Summary"].iter_rows(min_row=2, max_row=4, values_only=True))
+    assert summary["Total Fines (collected + accrued)"] == "₹14.50"
+    assert summary["Average Fine per Transaction (collected + accrued)"] == f"₹{14.5 / 90:.2f}"
+
+
+async def test_job_running_past_its_timeout_fails(db):
+    async def hang(job_id):
+        await asyncio.sleep(10)
+
+    started = await jobs.start_job(db, "report", hang, timeout=0.05)
+    job = await wait_for_job(started["_id"])
+    assert job["status"] == "failed"
+    assert "Timed out" in job["error"]
+
+
+async def test_job_of_a_dead_worker_fails_after_its_deadline(db):
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await db.jobs.insert_one({"_id": "orphan", "kind": "report", "status": "running", "deadline": past.isoformat()})
+
+    job = await server.get_report_job("orphan")
+    assert job["status"] == "failed"
+    assert job["error"] == "Job did not finish by its deadline"
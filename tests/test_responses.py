@@ -0,0 +1,61 @@
+import json
+from datetime import datetime
+
+import httpx
+import numpy as np
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def fetch(path, fast, monkeypatch):
+    monkeypatch.setattr(server, "FAST_RESPONSES", fast)
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.get(path)
+
+
+@pytest.mark.parametrize("path", [
+    "/api/books?limit=7",
+    "/api/users?limit=7",
+    "/api/transactions?limit=7",
+    "/api/transactions?from=2024-01-01&limit=7",
+    "/api/analytics/top-borrowers",
+    "/api/analytics/top-books",
+    "/api/analytics/genre-distribution",
+    "/api/analytics/overdue-list?limit=5",
+])
+async def test_fast_path_matches_default_rendering(library, monkeypatch, path):
+    default = await fetch(path, False, monkeypatch)
+    fast = await fetch(path, True, monkeypatch)
+
+    assert fast.status_code == default.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.json() == default.json()
+    assert fast.headers.get("X-Next-Cursor") == default.headers.get("X-Next-Cursor")
+
+
+@pytest.mark.parametrize("path", ["/api/analytics/top-borrowers", "/api/analytics/top-books"])
+@pytest.mark.parametrize("limit", [0, -1, server.MAX_PAGE_SIZE + 1])
+async def test_top_n_limit_is_bounded(library, monkeypatch, path, limit):
+    response = await fetch(f"{path}?limit={limit}", False, monkeypatch)
+    assert response.status_code == 422
+
+
+async def test_fast_stream_matches_default(library, monkeypatch):
+    default = await fetch("/api/transactions?stream=true", False, monkeypatch)
+    fast = await fetch("/api/transactions?stream=true", True, monkeypatch)
+
+    assert fast.text.splitlines() == [
+        json.dumps(json.loads(line), separators=(",", ":")) for line in default.text.splitlines()
+    ]
+
+
+def test_fast_json_handles_numpy_and_naive_datetimes():
+    body = server.FastJSONResponse({
+        "count": np.int64(3), "fines": np.float64(2.5), "days": np.array([1, 2]),
+        "due": datetime(2024, 1, 15, 9, 30),
+    }).body
+    assert json.loads(body) == {"count": 3, "fines": 2.5, "days": [1, 2], "due": "2024-01-15T09:30:00+00:00"}
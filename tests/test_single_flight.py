@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import server
+from cache import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def count_calls(monkeypatch):
+    """Count calls to a collection method across every collection"""
+    def patch(collection, method):
+        calls = []
+        original = getattr(type(collection), method)
+
+        def counted(self, *args, **kwargs):
+            calls.append(self.name)
+            return original(self, *args, **kwargs)
+
+        monkeypatch.setattr(type(collection), method, counted)
+        return calls
+    return patch
+
+
+@pytest.mark.parametrize("endpoint", [
+    lambda: server.get_top_books(server.Response(), 10),
+    lambda: server.get_top_borrowers(server.Response(), 10),
+    lambda: server.get_genre_distribution(server.Response()),
+    lambda: server.get_overdue_list(server.Response(), None, None),
+])
+async def test_concurrent_analytics_calls_share_one_fetch(library, count_calls, endpoint):
+    calls = count_calls(library.transactions, "aggregate")
+
+    results = await asyncio.gather(*[endpoint() for _ in range(100)])
+
+    assert calls == ["transactions"]
+    assert all(result == results[0] for result in results)
+
+
+async def test_concurrent_dashboard_calls_share_one_fetch(library, count_calls):
+    await server.rebuild_dashboard_stats()
+    calls = count_calls(library.dashboard_stats, "find_one")
+
+    results = await asyncio.gather(*[server.get_dashboard_stats() for _ in range(100)])
+
+    assert calls == ["dashboard_stats"]
+    assert results[0]["total_transactions"] == 90
+
+
+async def test_later_calls_start_a_new_flight():
+    flights = SingleFlight()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0)
+        return len(loads)
+
+    assert await flights.do("key", load) == 1
+    assert await flights.do("key", load) == 2
+
+
+async def test_errors_reach_every_waiter():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(*[flights.do("key", fail) for _ in range(5)], return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flights.stats()["in_flight"] == 0
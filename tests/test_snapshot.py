@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import Response
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr(server, "SNAPSHOT_REFRESH_INTERVAL", 600)
+    return tmp_path
+
+
+async def live_rows(pipeline):
+    return await server.db.transactions.aggregate(pipeline).to_list(None)
+
+
+async def test_analytics_match_live_aggregation(library, snapshot_dir):
+    await server.sweep_accrued_fines()
+    await server.refresh_snapshot()
+
+    response = Response()
+    assert await server.get_top_borrowers(response, 5) == await live_rows(server.top_borrowers_pipeline(5))
+    assert response.headers["X-Snapshot-At"].endswith("+00:00")
+    assert await server.get_top_books(Response(), 5) == await live_rows(server.top_books_pipeline(5))
+    assert await server.get_genre_distribution(Response()) == await live_rows(server.genre_distribution_pipeline())
+
+
+async def test_refresh_appends_new_returns(library, snapshot_dir):
+    first = await server.refresh_snapshot()
+    await server.return_book(server.TransactionReturn(transaction_id="T0000"))
+    await server.issue_book(server.TransactionCreate(book_id="B005", user_id="U001"))
+
+    second = await server.refresh_snapshot()
+    assert len(second["closed_parts"]) == len(first["closed_parts"]) + 1
+    assert "T0000" in second["overlap"]
+
+    # Re-reading the overlap window appends nothing twice
+    third = await server.refresh_snapshot()
+    assert third["closed_parts"] == second["closed_parts"]
+
+    table, _ = server.read_snapshot()
+    assert table.num_rows == await library.transactions.count_documents({})
+    assert sorted(table["transaction_id"].to_pylist()) == sorted(await library.transactions.distinct("transaction_id"))
+    assert len(list(snapshot_dir.glob("*.arrow"))) == len(third["closed_parts"]) + 1
+
+
+async def test_full_rebuild_includes_archive(library, snapshot_dir):
+    total = await library.transactions.count_documents({})
+    await server.archive_transactions(older_than=timedelta(days=30))
+
+    manifest = await server.refresh_snapshot(full=True)
+    table, _ = server.read_snapshot()
+    assert len(manifest["closed_parts"]) == 1
+    assert table.num_rows == total
+
+
+async def test_without_snapshot_falls_back_to_mongo(library, snapshot_dir):
+    response = Response()
+    assert await server.get_top_books(response, 5) == await live_rows(server.top_books_pipeline(5))
+    assert "X-Snapshot-At" not in response.headers